@@ -716,6 +716,8 @@ async def create_tables(conn):
     
     await conn.execute('CREATE INDEX idx_metrics_token_id ON token_metrics_seconds(token_id)')
     await conn.execute('CREATE INDEX idx_metrics_ts ON token_metrics_seconds(ts)')
+    # Частковий індекс для "цінових" секунд (існуючі БД: migrations/20261017_metrics_priced_partial_index.sql)
+    await conn.execute('CREATE INDEX idx_metrics_token_ts_priced ON token_metrics_seconds(token_id, ts) WHERE usd_price IS NOT NULL AND usd_price > 0')
 
     # History tables (archived tokens/metrics/trades)
     await conn.execute('CREATE TABLE tokens_history (LIKE tokens INCLUDING ALL)')
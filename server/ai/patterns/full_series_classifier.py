@@ -4,28 +4,27 @@ from __future__ import annotations
 import numpy as np
 from typing import Dict, Any, Tuple
 
+try:
+    from numba import njit
+except ImportError:  # numba не установлен -> numpy-реализация _price_features_np
+    njit = None
+
 
 def _safe_arr(x):
     return np.asarray(x, dtype=float) if x is not None else np.asarray([], dtype=float)
 
 
-def compute_full_features(series: Dict[str, Any]) -> Dict[str, float]:
-    """Compute global features on full series (from birth to current).
-
-    series keys expected: price, liquidity, mcap, holders, buy_count, sell_count
-    Each value is a list aligned by time (ascending).
-    """
-    prices = _safe_arr(series.get("price"))
-    liq = _safe_arr(series.get("liquidity"))
-    mcap = _safe_arr(series.get("mcap"))
-    buys = _safe_arr(series.get("buy_count"))
-    sells = _safe_arr(series.get("sell_count"))
+# Порядок выхода _price_features: slope_total, r2_total, volatility, monotonicity,
+# max_drawdown, recovery_ratio, run_up_total, down_depth
+_PRICE_FEATURE_KEYS = (
+    "slope_total", "r2_total", "volatility", "monotonicity",
+    "max_drawdown", "recovery_ratio", "run_up_total", "down_depth",
+)
 
-    n = int(prices.size)
-    feats: Dict[str, float] = {"n": float(n)}
-    if n < 2 or not np.isfinite(prices).any():
-        return feats
 
+def _price_features_np(prices):
+    """numpy-версия ядра (без numba); порядок выхода = _PRICE_FEATURE_KEYS"""
+    n = prices.size
     eps = 1e-9
     ln_p = np.log(np.clip(prices, eps, None))
     dln = np.diff(ln_p, prepend=ln_p[0])
@@ -53,21 +52,125 @@ def compute_full_features(series: Dict[str, Any]) -> Dict[str, float]:
     vol = float(np.std(dln))
     monotonicity = float(np.mean((dln > 0).astype(float)))
 
+    return np.array([beta, r2, vol, monotonicity, max_dd, recovery_ratio, run_up_total, down_depth])
+
+
+# Без fastmath: NaN в ценах должны вести себя как в numpy (nanmax, распространение в max/min).
+def _price_features_loops(prices):
+    n = prices.shape[0]
+    eps = 1e-9
+    out = np.empty(8, dtype=np.float64)
+
+    # ln(clip(p, eps)) и приращения (первое = 0)
+    ln_p = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        p = prices[i]
+        ln_p[i] = np.log(eps) if p < eps else np.log(p)
+    dln = np.empty(n, dtype=np.float64)
+    dln[0] = 0.0
+    for i in range(1, n):
+        dln[i] = ln_p[i] - ln_p[i - 1]
+
+    # Тренд (OLS) по всей серии
+    xm = (n - 1) / 2.0
+    ym = 0.0
+    for i in range(n):
+        ym += ln_p[i]
+    ym /= n
+    num = 0.0
+    den = 0.0
+    for i in range(n):
+        num += (i - xm) * (ln_p[i] - ym)
+        den += (i - xm) * (i - xm)
+    beta = num / (den + eps)
+    ss_res = 0.0
+    ss_tot = 0.0
+    for i in range(n):
+        r = ln_p[i] - ((i - xm) * beta + ym)
+        ss_res += r * r
+        ss_tot += (ln_p[i] - ym) * (ln_p[i] - ym)
+    r2 = 1.0 - ss_res / (ss_tot + eps)
+
+    # Просадка / восстановление; cum_max, max, min распространяют NaN как np.maximum
+    cum_max = prices[0]
+    p_max = prices[0]
+    p_min = prices[0]
+    max_dd = np.nan
+    for i in range(n):
+        p = prices[i]
+        if np.isnan(p) or np.isnan(cum_max):
+            cum_max = np.nan
+        elif p > cum_max:
+            cum_max = p
+        if np.isnan(p) or np.isnan(p_max):
+            p_max = np.nan
+            p_min = np.nan
+        else:
+            if p > p_max:
+                p_max = p
+            if p < p_min:
+                p_min = p
+        if not np.isnan(cum_max):
+            dd = 1.0 - p / (cum_max if cum_max > eps else eps)
+            if np.isnan(max_dd) or dd > max_dd:
+                max_dd = dd
+
+    # Волатильность / монотонность
+    d_mean = 0.0
+    pos = 0
+    for i in range(n):
+        d_mean += dln[i]
+        if dln[i] > 0:
+            pos += 1
+    d_mean /= n
+    var = 0.0
+    for i in range(n):
+        var += (dln[i] - d_mean) * (dln[i] - d_mean)
+
+    out[0] = beta
+    out[1] = r2
+    out[2] = np.sqrt(var / n)
+    out[3] = pos / n
+    out[4] = max_dd
+    out[5] = prices[n - 1] / (p_max + eps)
+    out[6] = p_max / (prices[0] + eps) - 1.0
+    out[7] = 1.0 - p_min / (prices[0] + eps)
+    return out
+
+
+# Без сигнатуры -> компиляция при первом вызове, а не при импорте модуля;
+# cache=True -> машинный код берётся из __pycache__, JIT платит только первый запуск
+_price_features = njit(cache=True)(_price_features_loops) if njit is not None else _price_features_np
+
+
+def compute_full_features(series: Dict[str, Any]) -> Dict[str, float]:
+    """Compute global features on full series (from birth to current).
+
+    series keys expected: price, liquidity, mcap, holders, buy_count, sell_count
+    Each value is a list aligned by time (ascending).
+    """
+    prices = _safe_arr(series.get("price"))
+    liq = _safe_arr(series.get("liquidity"))
+    mcap = _safe_arr(series.get("mcap"))
+    buys = _safe_arr(series.get("buy_count"))
+    sells = _safe_arr(series.get("sell_count"))
+
+    n = int(prices.size)
+    feats: Dict[str, float] = {"n": float(n)}
+    if n < 2 or not np.isfinite(prices).any():
+        return feats
+
+    pf = _price_features(prices)
+
     # Activity
+    eps = 1e-9
     tx_total = float(np.nansum(buys + sells)) if buys.size and sells.size else 0.0
     sells_sum = float(np.nansum(sells)) if sells.size else 0.0
     buys_sum = float(np.nansum(buys)) if buys.size else 0.0
     sell_share = float(sells_sum / (buys_sum + sells_sum + eps)) if (buys.size or sells.size) else 0.0
 
+    feats.update({key: float(v) for key, v in zip(_PRICE_FEATURE_KEYS, pf)})
     feats.update({
-        "slope_total": beta,
-        "r2_total": r2,
-        "volatility": vol,
-        "monotonicity": monotonicity,
-        "max_drawdown": max_dd,
-        "recovery_ratio": recovery_ratio,
-        "run_up_total": run_up_total,
-        "down_depth": down_depth,
         "tx_total": tx_total,
         "sell_share": sell_share,
         "price_now": float(prices[-1]),
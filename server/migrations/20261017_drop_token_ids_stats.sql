@@ -0,0 +1,19 @@
+-- Migration: Drop token_ids_stats counter and its triggers
+-- Date: 2026-10-17
+-- Description: TokensReaderV2 (temp/v2) більше не читає token_ids_stats: total_count береться
+-- з оцінки pg_class (reltuples). Лічильник на одному рядку серіалізував усі INSERT/DELETE у token_ids.
+-- Безпечно для БД, де token_ids_stats.sql ніколи не застосовували.
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS token_ids_stats_on_insert ON token_ids;
+DROP TRIGGER IF EXISTS token_ids_stats_on_delete ON token_ids;
+DROP TRIGGER IF EXISTS token_ids_stats_on_truncate ON token_ids;
+
+DROP FUNCTION IF EXISTS token_ids_stats_insert();
+DROP FUNCTION IF EXISTS token_ids_stats_delete();
+DROP FUNCTION IF EXISTS token_ids_stats_truncate();
+
+DROP TABLE IF EXISTS token_ids_stats;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Partial index for "priced" seconds of token_metrics_seconds.
+-- Covers the common predicate token_id=$1 AND usd_price IS NOT NULL AND usd_price > 0
+-- (iterations COUNT(*) in tools/check_token_entry.py, analyzer, AI tools): the count becomes an
+-- index-only scan, and ORDER BY ts ... LIMIT n reads the prefix straight from the index.
+--
+-- CONCURRENTLY does not block writes from the live collector, but it cannot run inside a
+-- transaction block: apply as a single statement, e.g. psql -d crypto_db -f <this file>.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metrics_token_ts_priced
+    ON token_metrics_seconds (token_id, ts)
+    WHERE usd_price IS NOT NULL AND usd_price > 0;
@@ -0,0 +1,24 @@
+-- Migration: NOTIFY token_change на будь-яку зміну token_ids
+-- Date: 2026-10-17
+-- Description: TokensReaderV2 (temp/v2) оновлює список токенів по LISTEN token_change.
+-- Без тригера reader переходить на резервне опитування (watchdog_interval) і пише попередження.
+-- Застосовується до БД з таблицею token_ids (POSTGRES_CONFIG у temp/v2/_v2_db_pool.py).
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION notify_token_change() RETURNS trigger AS $$
+BEGIN
+    -- Один NOTIFY на statement: PostgreSQL сам зливає однакові повідомлення в транзакції
+    PERFORM pg_notify('token_change', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS token_ids_notify_change ON token_ids;
+
+CREATE TRIGGER token_ids_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON token_ids
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_token_change();
+
+COMMIT;
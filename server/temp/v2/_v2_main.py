@@ -12,6 +12,7 @@ from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import asyncio
 import json
+import orjson
 from typing import Optional, List, Dict
 from _v2_tokens_reader import TokensReaderV2
 from _v2_chart_data_reader import ChartDataReader
@@ -118,6 +119,8 @@ async def websocket_tokens(websocket: WebSocket):
     """
     WebSocket для отримання списку токенів з БД
     Відправляє ВСІ токени при підключенні
+    ?encoding=deflate → знімки токенів приходять binary кадрами zlib(JSON)
+    (помилки — як і раніше, JSON-текстом)
     """
     try:
         # print("🔌 WebSocket /ws/tokens: Client connecting...")
@@ -125,55 +128,61 @@ async def websocket_tokens(websocket: WebSocket):
         # print("✅ WebSocket /ws/tokens: Connection accepted")
         
         await ensure_tokens_reader()
-        await state.tokens_reader.add_client(websocket)
-        # print(f"👥 WebSocket /ws/tokens: Client added (total clients: {len(state.tokens_reader.connected_clients)})")
+        deflate = websocket.query_params.get("encoding") == "deflate"
+        snapshot_sent = await state.tokens_reader.add_client(websocket, deflate=deflate)
+        # print(f"👥 WebSocket /ws/tokens: Client added (total clients: {len(state.tokens_reader.client_queues)})")
         
         # Відправляємо всі токени з БД при підключенні
-        try:
-            # print("📊 WebSocket /ws/tokens: Fetching tokens from DB...")
-            result = await state.tokens_reader.get_tokens_from_db(limit=1000)
-            if result["success"]:
-                token_count = len(result.get('tokens', []))
-                # print(f"📡 WebSocket /ws/tokens: Sending {token_count} tokens to client")
+        # (якщо кешований знімок уже в черзі клієнта — БД не чіпаємо).
+        # Кадри йдуть через чергу клієнта: розсилку і знімок відправляє один _client_writer
+        if not snapshot_sent:
+            reader = state.tokens_reader
+            broadcast_seq = reader.broadcast_seq
+            try:
+                # print("📊 WebSocket /ws/tokens: Fetching tokens from DB...")
+                result = await state.tokens_reader.get_tokens_from_db(limit=1000, include_total=True)
+                if result["success"]:
+                    token_count = len(result.get('tokens', []))
+                    # print(f"📡 WebSocket /ws/tokens: Sending {token_count} tokens to client")
                 
-                # DEBUG: Виводимо перші 2 токени
-                if token_count > 0:
-                    # print(f"🔍 DEBUG: First token data:")
-                    # first_token = result['tokens'][0]
-                    # print(f"   - id: {first_token.get('id', 'MISSING')}")
-                    # print(f"   - name: {first_token.get('name', 'MISSING')}")
-                    # print(f"   - symbol: {first_token.get('symbol', 'MISSING')}")
-                    # print(f"   - pair: {first_token.get('pair', 'MISSING')}")
-                    # print(f"   - price: {first_token.get('price', 'MISSING')}")
+                    # DEBUG: Виводимо перші 2 токени
+                    if token_count > 0:
+                        # print(f"🔍 DEBUG: First token data:")
+                        # first_token = result['tokens'][0]
+                        # print(f"   - id: {first_token.get('id', 'MISSING')}")
+                        # print(f"   - name: {first_token.get('name', 'MISSING')}")
+                        # print(f"   - symbol: {first_token.get('symbol', 'MISSING')}")
+                        # print(f"   - pair: {first_token.get('pair', 'MISSING')}")
+                        # print(f"   - price: {first_token.get('price', 'MISSING')}")
                     
-                    await websocket.send_text(json.dumps(result, ensure_ascii=False))
+                        reader.queue_initial(websocket, orjson.dumps(result).decode(), broadcast_seq)
+                    else:
+                        # Порожній результат
+                        empty_result = {
+                            "success": True,
+                            "tokens": [],
+                            "total_found": 0,
+                            "total_count": 0
+                        }
+                        reader.queue_initial(websocket, json.dumps(empty_result, ensure_ascii=False), broadcast_seq, compressible=False)
                 else:
-                    # Порожній результат
-                    empty_result = {
-                        "success": True,
-                        "tokens": [],
-                        "total_found": 0,
-                        "total_count": 0
+                    print(f"❌ No tokens in database: {result.get('error', 'Unknown error')}")
+                    error_result = {
+                        "success": False,
+                        "error": result.get('error', 'Unknown error'),
+                        "tokens": []
                     }
-                    await websocket.send_text(json.dumps(empty_result, ensure_ascii=False))
-            else:
-                print(f"❌ No tokens in database: {result.get('error', 'Unknown error')}")
+                    reader.queue_initial(websocket, json.dumps(error_result, ensure_ascii=False), broadcast_seq, compressible=False)
+            except Exception as e:
+                import traceback
+                print(f"❌ Error loading tokens: {e}")
+                print(f"❌ Traceback: {traceback.format_exc()}")
                 error_result = {
                     "success": False,
-                    "error": result.get('error', 'Unknown error'),
+                    "error": str(e),
                     "tokens": []
                 }
-                await websocket.send_text(json.dumps(error_result, ensure_ascii=False))
-        except Exception as e:
-            import traceback
-            print(f"❌ Error loading tokens: {e}")
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            error_result = {
-                "success": False,
-                "error": str(e),
-                "tokens": []
-            }
-            await websocket.send_text(json.dumps(error_result, ensure_ascii=False))
+                reader.queue_initial(websocket, json.dumps(error_result, ensure_ascii=False), broadcast_seq, compressible=False)
         
         # Слухаємо WebSocket
         while True:
@@ -520,5 +529,6 @@ async def shutdown_event():
 # ============================================================================
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host=config.HOST, port=config.PORT, reload=config.DEBUG)
+    # uvloop явно: швидший event loop для WebSocket-розсилок і asyncpg
+    uvicorn.run("main:app", host=config.HOST, port=config.PORT, reload=config.DEBUG, loop="uvloop", http="httptools")
 
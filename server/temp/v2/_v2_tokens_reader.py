@@ -3,13 +3,102 @@
 # SQLite (BACKUP - commented out)
 # import aiosqlite
 import asyncio
-import json
+import orjson
+import zlib
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from fastapi import WebSocket
 # PostgreSQL (ACTIVE)
 from _v2_db_pool import get_db_pool
-from config import config
+
+# Проекція token_ids для списку і для одного токена (порядок = розпакування в _row_to_token)
+TOKEN_COLUMNS = """
+    id, token_address, token_pair, is_honeypot, security_analyzed_at, created_at,
+    pattern, check_dexscreener, check_jupiter, check_sol_rpc,
+    name, symbol, icon, decimals, twitter, dev,
+    -- NUMERIC → float8 (+ COALESCE) прямо в SQL: asyncpg декодує float8 у C, Python нічого не конвертує
+    COALESCE(circ_supply, 0)::float8 AS circ_supply, COALESCE(total_supply, 0)::float8 AS total_supply,
+    token_program, launchpad, holder_count,
+    COALESCE(usd_price, 0)::float8 AS usd_price, COALESCE(liquidity, 0)::float8 AS liquidity,
+    COALESCE(fdv, 0)::float8 AS fdv, COALESCE(mcap, 0)::float8 AS mcap,
+    COALESCE(bonding_curve, 0)::float8 AS bonding_curve, COALESCE(organic_score, 0)::float8 AS organic_score,
+    organic_score_label, updated_at
+"""
+
+# Кількість рядків token_ids без COUNT(*) і без лічильника на гарячому рядку:
+# reltuples/relpages з останнього ANALYZE, масштабовані на поточний розмір таблиці (як рахує планувальник).
+# NULL, якщо таблицю ще не аналізували → тоді точний COUNT(*) (таблиця в цьому випадку мала)
+TOKEN_COUNT_ESTIMATE_SQL = """
+    SELECT CASE WHEN relpages > 0 AND reltuples >= 0
+                THEN (reltuples / relpages * (pg_relation_size(oid) / current_setting('block_size')::int))::bigint
+           END
+    FROM pg_class
+    WHERE oid = 'token_ids'::regclass
+"""
+
+# Чи встановлено тригер NOTIFY на token_ids (migrations/20261017_token_ids_change_notify.sql)
+NOTIFY_TRIGGER_SQL = """
+    SELECT EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgrelid = 'token_ids'::regclass AND tgname = 'token_ids_notify_change'
+    )
+"""
+
+# Дешева проба змін для резервного опитування: лічильники pg_stat + max(updated_at) по індексу
+CHANGE_PROBE_SQL = """
+    SELECT
+        (SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables
+         WHERE relid = 'token_ids'::regclass) AS changes,
+        (SELECT max(updated_at) FROM token_ids) AS last_updated_at
+"""
+
+def _row_to_token(row) -> Dict[str, Any]:
+    """Record з TOKEN_COLUMNS → dict токена для frontend"""
+    # Позиційне розпакування Record (порядок = колонки SELECT) замість 29 пошуків по ключу
+    (
+        token_id, token_address, token_pair, is_honeypot, security_analyzed_at, created_at,
+        pattern, check_dexscreener, check_jupiter, check_sol_rpc,
+        name, symbol, icon, decimals, twitter, dev,
+        circ_supply, total_supply, token_program, launchpad, holder_count,
+        usd_price, liquidity, fdv, mcap, bonding_curve,
+        organic_score, organic_score_label, updated_at,
+    ) = row
+    
+    return {
+        "id": token_id,  # INTEGER id для ідентифікації
+        "token_address": token_address,  # mint address
+        "name": name or "Unknown",
+        "symbol": symbol or "UNKNOWN",
+        "icon": icon or "",
+        "decimals": decimals or 0,
+        "twitter": twitter or "",
+        "dev": dev or "",
+        "circ_supply": circ_supply,
+        "total_supply": total_supply,
+        "token_program": token_program or "",
+        "launchpad": launchpad or "",
+        "holders": holder_count or 0,
+        "price": usd_price,
+        "liquidity": liquidity,
+        "fdv": fdv,
+        "mcap": mcap,
+        "bonding_curve": bonding_curve,
+        "organic_score": organic_score,
+        "organic_score_label": organic_score_label or "",
+        "dex": "Analyzing...",
+        "pair": token_pair,
+        "is_honeypot": is_honeypot,
+        "pattern": pattern or "",
+        "check_dexscreener": check_dexscreener or 0,
+        "check_jupiter": check_jupiter or 0,
+        "check_sol_rpc": check_sol_rpc or 0,
+        # 24h transactions (placeholders; real values can be joined later from stats table)
+        "stats_24h_num_buys": 0,
+        "stats_24h_num_sells": 0,
+        "security_analyzed_at": security_analyzed_at,  # datetime серіалізує orjson
+        "updated_at": updated_at,
+        "created_at": created_at
+    }
 
 class TokensReaderV2:
     def __init__(self, db_path: str = "db/tokens.db", debug: bool = False):
@@ -21,14 +110,36 @@ class TokensReaderV2:
         # self.db_lock = asyncio.Lock()
         self.debug = debug
         
-        # WebSocket клієнти для real-time оновлень
-        self.connected_clients: List[WebSocket] = []
+        # WebSocket клієнти для real-time оновлень: у кожного своя черга + writer task,
+        # тож повільний клієнт не гальмує розсилку іншим
+        self.client_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.client_writers: Dict[WebSocket, asyncio.Task] = {}
+        self.client_queue_size: int = 8
+        # Клієнти, що підключились з ?encoding=deflate: отримують binary кадр zlib(JSON),
+        # стиснутий один раз на розсилку, а не окремо для кожного з'єднання
+        self.deflate_clients: set = set()
+        self.deflate_level: int = 6
         
-        # Авто-оновлення
-        self.auto_refresh_task: Optional[asyncio.Task] = None
-        self.refresh_interval: int = config.TOKENS_REFRESH_INTERVAL
-        self.last_token_count: int = 0  # Зберігаємо кількість токенів для перевірки змін
-        self.last_updated_at: Optional[datetime] = None  # Зберігаємо час останнього оновлення
+        # Авто-оновлення: LISTEN token_change (тригер на token_ids, див. migrations/20261017_token_ids_change_notify.sql)
+        self.listener_conn = None  # Окреме довгоживуче з'єднання з пулу під LISTEN
+        # Watchdog: перепідключає LISTEN після розриву і раз на інтервал опитує БД,
+        # якщо NOTIFY не приходили (тригера немає або з'єднання мовчки зависло)
+        self.watchdog_task: Optional[asyncio.Task] = None
+        self.watchdog_wakeup = asyncio.Event()
+        self.watchdog_interval: float = 10.0
+        self.notify_seen: bool = False
+        self.last_probe: Optional[tuple] = None
+        self.broadcast_task: Optional[asyncio.Task] = None  # Існує тільки поки є незроблене оновлення
+        self.refresh_pending: bool = False
+        self.notify_debounce: float = 0.2  # Зливаємо пачку NOTIFY в одне оновлення
+        self.last_token_count: int = 0  # Зберігаємо кількість токенів
+        
+        # Кеш кадрів останньої розсилки (False → JSON-текст, True → zlib):
+        # нові клієнти отримують його одразу без запиту в БД
+        self.last_frames: Dict[bool, Union[str, bytes]] = {}
+        self.last_payload_at: Optional[datetime] = None
+        # Лічильник розсилок: початковий знімок, прочитаний до чергової розсилки, вже застарів
+        self.broadcast_seq: int = 0
     
     async def ensure_connection(self):
         """PostgreSQL - не потрібне (pool створюється автоматично)"""
@@ -38,126 +149,31 @@ class TokensReaderV2:
         """PostgreSQL - не потрібне (pool закривається глобально)"""
         pass
     
-    async def get_tokens_from_db(self, limit: int = 1000, offset: int = 0) -> Dict[str, Any]:
-        """Отримує токени з БД з пагінацією (PostgreSQL)"""
+    async def get_tokens_from_db(
+        self,
+        limit: int = 1000,
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[int] = None,
+        conn=None,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """Отримує токени з БД з keyset-пагінацією (PostgreSQL)
+        
+        Наступна сторінка: передати next_cursor з попередньої відповіді
+        (cursor_created_at + cursor_id). Без курсора — найновіші токени.
+        conn: вже виділене з'єднання (інакше береться з пулу).
+        include_total: додати total_count (інакше ключа у відповіді немає, has_more — з розміру сторінки).
+        """
         try:
-            pool = await get_db_pool()
-            
             # if self.debug:
-                # print(f"🔍 Getting tokens from DB: limit={limit}, offset={offset}")
+                # print(f"🔍 Getting tokens from DB: limit={limit}, cursor={cursor_created_at}/{cursor_id}")
+            
+            if conn is not None:
+                return await self._fetch_tokens(conn, limit, cursor_created_at, cursor_id, include_total)
             
+            pool = await get_db_pool()
             async with pool.acquire() as conn:
-                # Отримуємо загальну кількість токенів
-                total_count = await conn.fetchval("""
-                    SELECT COUNT(*) FROM token_ids
-                """)
-                
-                # Отримуємо токени з пагінацією (всі поля в одній таблиці!)
-                rows = await conn.fetch("""
-                    SELECT 
-                        id, token_address, token_pair, is_honeypot, security_analyzed_at, created_at,
-                        pattern, check_dexscreener, check_jupiter, check_sol_rpc,
-                        name, symbol, icon, decimals, twitter, dev,
-                        circ_supply, total_supply, token_program, launchpad, holder_count,
-                        usd_price, liquidity, fdv, mcap, bonding_curve,
-                        organic_score, organic_score_label, updated_at
-                    FROM token_ids
-                    ORDER BY created_at DESC 
-                    LIMIT $1 OFFSET $2
-                """, limit, offset)
-                
-                formatted_tokens = []
-                for row in rows:
-                    # Всі дані тепер в одній таблиці!
-                    token_id = row['id']
-                    token_address = row['token_address']
-                    token_pair = row['token_pair']
-                    is_honeypot = row['is_honeypot']
-                    security_analyzed_at = row['security_analyzed_at']
-                    created_at = row['created_at']
-                    pattern = row['pattern']
-                    check_dexscreener = row['check_dexscreener']
-                    check_jupiter = row['check_jupiter']
-                    check_sol_rpc = row['check_sol_rpc']
-                    name = row['name']
-                    symbol = row['symbol']
-                    icon = row['icon']
-                    decimals = row['decimals']
-                    twitter = row['twitter']
-                    dev = row['dev']
-                    token_program = row['token_program']
-                    launchpad = row['launchpad']
-                    holder_count = row['holder_count']
-                    # PostgreSQL Decimal → float для JSON serialization
-                    circ_supply = float(row['circ_supply']) if row['circ_supply'] is not None else 0
-                    total_supply = float(row['total_supply']) if row['total_supply'] is not None else 0
-                    usd_price = float(row['usd_price']) if row['usd_price'] is not None else 0
-                    liquidity = float(row['liquidity']) if row['liquidity'] is not None else 0
-                    fdv = float(row['fdv']) if row['fdv'] is not None else 0
-                    mcap = float(row['mcap']) if row['mcap'] is not None else 0
-                    bonding_curve = float(row['bonding_curve']) if row['bonding_curve'] is not None else 0
-                    organic_score = float(row['organic_score']) if row['organic_score'] is not None else 0
-                    organic_score_label = row['organic_score_label']
-                    updated_at = row['updated_at']
-                    
-                    # 24h transactions (placeholders; real values can be joined later from stats table)
-                    stats_24h_num_buys = 0
-                    stats_24h_num_sells = 0
-
-                    formatted_tokens.append({
-                        "id": token_id,  # INTEGER id для ідентифікації
-                        "token_address": token_address,  # mint address
-                        "name": name or "Unknown",
-                        "symbol": symbol or "UNKNOWN",
-                        "icon": icon or "",
-                        "decimals": decimals or 0,
-                        "twitter": twitter or "",
-                        "dev": dev or "",
-                        "circ_supply": circ_supply or 0,
-                        "total_supply": total_supply or 0,
-                        "token_program": token_program or "",
-                        "launchpad": launchpad or "",
-                        "holders": holder_count or 0,
-                        "price": usd_price or 0,
-                        "liquidity": liquidity or 0,
-                        "fdv": fdv or 0,
-                        "mcap": mcap or 0,
-                        "bonding_curve": bonding_curve or 0,
-                        "organic_score": organic_score or 0,
-                        "organic_score_label": organic_score_label or "",
-                        "dex": "Analyzing...",
-                        "pair": token_pair,
-                        "is_honeypot": is_honeypot,
-                        "pattern": pattern or "",
-                        "check_dexscreener": check_dexscreener or 0,
-                        "check_jupiter": check_jupiter or 0,
-                        "check_sol_rpc": check_sol_rpc or 0,
-                        # 24h transactions (Jupiter stats)
-                        "stats_24h_num_buys": stats_24h_num_buys or 0,
-                        "stats_24h_num_sells": stats_24h_num_sells or 0,
-                        "security_analyzed_at": security_analyzed_at.isoformat() if security_analyzed_at and hasattr(security_analyzed_at, 'isoformat') else str(security_analyzed_at) if security_analyzed_at else None,
-                        "updated_at": updated_at.isoformat() if updated_at and hasattr(updated_at, 'isoformat') else str(updated_at) if updated_at else None,
-                        "created_at": created_at.isoformat() if created_at and hasattr(created_at, 'isoformat') else str(created_at) if created_at else None
-                    })
-                
-                result = {
-                    "success": True,
-                    "tokens": formatted_tokens,
-                    "total_found": len(formatted_tokens),
-                    "total_count": total_count,
-                    "limit": limit,
-                    "offset": offset,
-                    "has_more": (offset + limit) < total_count,
-                    "scan_time": datetime.now().isoformat()
-                }
-                
-                # Оновлюємо збережену кількість
-                self.last_token_count = total_count
-                
-                if self.debug:
-                    print(f"✅ Retrieved {len(formatted_tokens)} tokens from DB (total: {total_count})")
-                
-                return result
+                return await self._fetch_tokens(conn, limit, cursor_created_at, cursor_id, include_total)
                 
         except Exception as e:
             if self.debug:
@@ -169,6 +185,67 @@ class TokensReaderV2:
                 "total_count": 0
             }
     
+    async def _fetch_tokens(
+        self,
+        conn,
+        limit: int,
+        cursor_created_at: Optional[datetime],
+        cursor_id: Optional[int],
+        include_total: bool
+    ) -> Dict[str, Any]:
+        """Сторінка токенів на вже отриманому з'єднанні"""
+        # Отримуємо загальну кількість токенів тільки на запит (оцінка з pg_class, див. TOKEN_COUNT_ESTIMATE_SQL)
+        total_count = None
+        if include_total:
+            total_count = await conn.fetchval(TOKEN_COUNT_ESTIMATE_SQL)
+            if total_count is None:
+                total_count = await conn.fetchval("SELECT COUNT(*) FROM token_ids")
+        
+        # Отримуємо токени з пагінацією (всі поля в одній таблиці!)
+        # Keyset по (created_at, id) замість OFFSET → індекс idx_token_ids_created_desc
+        tokens_query = f"""
+            SELECT {TOKEN_COLUMNS}
+            FROM token_ids
+            WHERE $2::timestamp IS NULL OR (created_at, id) < ($2::timestamp, $3::int)
+            ORDER BY created_at DESC, id DESC
+            LIMIT $1
+        """
+        
+        formatted_tokens = []
+        # Курсор з prefetch: рядки надходять пачками, а не всі 1000 Record одразу
+        # (курсор asyncpg працює тільки всередині транзакції)
+        async with conn.transaction():
+            async for row in conn.cursor(
+                tokens_query, limit, cursor_created_at, cursor_id, prefetch=200
+            ):
+                formatted_tokens.append(_row_to_token(row))
+        
+        has_more = len(formatted_tokens) == limit
+        next_cursor = None
+        if has_more:
+            last_token = formatted_tokens[-1]
+            next_cursor = {"created_at": last_token['created_at'], "id": last_token['id']}
+        
+        result = {
+            "success": True,
+            "tokens": formatted_tokens,
+            "total_found": len(formatted_tokens),
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            "scan_time": datetime.now().isoformat()
+        }
+        
+        if include_total:
+            result["total_count"] = total_count
+            # Оновлюємо збережену кількість
+            self.last_token_count = total_count
+        
+        if self.debug:
+            print(f"✅ Retrieved {len(formatted_tokens)} tokens from DB (total: {total_count})")
+        
+        return result
+    
     async def get_token_by_address(self, token_address: str) -> Dict[str, Any]:
         """Отримує конкретний токен за адресою (PostgreSQL)"""
         try:
@@ -176,14 +253,8 @@ class TokensReaderV2:
             
             async with pool.acquire() as conn:
                 # Query merged token_ids (all data in one table)
-                row = await conn.fetchrow("""
-                    SELECT 
-                        id, token_address, token_pair, is_honeypot, security_analyzed_at, created_at,
-                        pattern, check_dexscreener, check_jupiter, check_sol_rpc,
-                        name, symbol, icon, decimals, twitter, dev,
-                        circ_supply, total_supply, token_program, launchpad, holder_count,
-                        usd_price, liquidity, fdv, mcap, bonding_curve,
-                        organic_score, organic_score_label, updated_at
+                row = await conn.fetchrow(f"""
+                    SELECT {TOKEN_COLUMNS}
                     FROM token_ids
                     WHERE token_address = $1
                 """, token_address)
@@ -195,70 +266,7 @@ class TokensReaderV2:
                         "token": None
                     }
                 
-                # Extract all data from merged table
-                token_id = row['id']
-                token_address = row['token_address']
-                token_pair = row['token_pair']
-                is_honeypot = row['is_honeypot']
-                security_analyzed_at = row['security_analyzed_at']
-                created_at = row['created_at']
-                pattern = row['pattern']
-                check_dexscreener = row['check_dexscreener']
-                check_jupiter = row['check_jupiter']
-                check_sol_rpc = row['check_sol_rpc']
-                name = row['name']
-                symbol = row['symbol']
-                icon = row['icon']
-                decimals = row['decimals']
-                twitter = row['twitter']
-                dev = row['dev']
-                token_program = row['token_program']
-                launchpad = row['launchpad']
-                holder_count = row['holder_count']
-                # PostgreSQL Decimal → float для JSON serialization
-                circ_supply = float(row['circ_supply']) if row['circ_supply'] is not None else 0
-                total_supply = float(row['total_supply']) if row['total_supply'] is not None else 0
-                usd_price = float(row['usd_price']) if row['usd_price'] is not None else 0
-                liquidity = float(row['liquidity']) if row['liquidity'] is not None else 0
-                fdv = float(row['fdv']) if row['fdv'] is not None else 0
-                mcap = float(row['mcap']) if row['mcap'] is not None else 0
-                bonding_curve = float(row['bonding_curve']) if row['bonding_curve'] is not None else 0
-                organic_score = float(row['organic_score']) if row['organic_score'] is not None else 0
-                organic_score_label = row['organic_score_label']
-                updated_at = row['updated_at']
-                
-                token = {
-                    "id": token_id,  # INTEGER id для ідентифікації
-                    "token_address": token_address,  # mint address
-                    "name": name or "Unknown",
-                    "symbol": symbol or "UNKNOWN",
-                    "icon": icon or "",
-                    "decimals": decimals or 0,
-                    "twitter": twitter or "",
-                    "dev": dev or "",
-                    "circ_supply": circ_supply or 0,
-                    "total_supply": total_supply or 0,
-                    "token_program": token_program or "",
-                    "launchpad": launchpad or "",
-                    "holders": holder_count or 0,
-                    "price": usd_price or 0,
-                    "liquidity": liquidity or 0,
-                    "fdv": fdv or 0,
-                    "mcap": mcap or 0,
-                    "bonding_curve": bonding_curve or 0,
-                    "organic_score": organic_score or 0,
-                    "organic_score_label": organic_score_label or "",
-                    "dex": "Analyzing...",
-                    "pair": token_pair,
-                    "is_honeypot": is_honeypot,
-                    "pattern": pattern or "",
-                    "check_dexscreener": check_dexscreener or 0,
-                    "check_jupiter": check_jupiter or 0,
-                    "check_sol_rpc": check_sol_rpc or 0,
-                    "security_analyzed_at": security_analyzed_at.isoformat() if security_analyzed_at and hasattr(security_analyzed_at, 'isoformat') else str(security_analyzed_at) if security_analyzed_at else None,
-                    "updated_at": updated_at.isoformat() if updated_at and hasattr(updated_at, 'isoformat') else str(updated_at) if updated_at else None,
-                    "created_at": created_at.isoformat() if created_at and hasattr(created_at, 'isoformat') else str(created_at) if created_at else None
-                }
+                token = _row_to_token(row)
                 
                 return {
                     "success": True,
@@ -286,26 +294,17 @@ class TokensReaderV2:
                         token_address,
                         name,
                         symbol,
-                        mcap,
-                        usd_price,
+                        COALESCE(mcap, 0)::float8 AS mcap,
+                        COALESCE(usd_price, 0)::float8 AS usd_price,
                         holder_count
                     FROM token_ids
-                    WHERE LOWER(name) LIKE LOWER($1) OR LOWER(symbol) LIKE LOWER($2)
-                    ORDER BY mcap DESC NULLS LAST
-                    LIMIT $3
-                """, f"%{query}%", f"%{query}%", limit)
+                    WHERE name ILIKE $1 OR symbol ILIKE $1  -- GIN trigram індекси (token_ids_indexes.sql)
+                    ORDER BY token_ids.mcap DESC NULLS LAST
+                    LIMIT $2
+                """, f"%{query}%", limit)
                 
                 formatted_tokens = []
-                for row in rows:
-                    token_id = row['id']
-                    token_address = row['token_address']
-                    name = row['name']
-                    symbol = row['symbol']
-                    # PostgreSQL Decimal → float для JSON serialization
-                    mcap = float(row['mcap']) if row['mcap'] is not None else 0
-                    price = float(row['usd_price']) if row['usd_price'] is not None else 0
-                    holders = row['holder_count']
-                    
+                for token_id, token_address, name, symbol, mcap, price, holders in rows:
                     formatted_tokens.append({
                         "id": token_id,  # INTEGER id для ідентифікації
                         "token_address": token_address,  # mint address
@@ -335,101 +334,249 @@ class TokensReaderV2:
                 "tokens": []
             }
     
-    async def add_client(self, websocket: WebSocket):
-        """Додає клієнта до списку підключених"""
-        self.connected_clients.append(websocket)
+    async def add_client(self, websocket: WebSocket, deflate: bool = False) -> bool:
+        """Додає клієнта до списку підключених
+        
+        deflate: клієнт приймає binary кадри zlib(JSON) замість тексту.
+        Повертає True, якщо клієнту вже поставлено в чергу кешований знімок токенів.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self.client_queues[websocket] = queue
+        if deflate:
+            self.deflate_clients.add(websocket)
+        self.client_writers[websocket] = asyncio.create_task(self._client_writer(websocket, queue))
+        
+        # Знімок з кешу (якщо з моменту останньої розсилки змін у БД не було)
+        snapshot_sent = bool(self.last_frames)
+        if snapshot_sent:
+            queue.put_nowait(self._frame(self.last_frames, deflate))
         
         # Якщо це перший клієнт, запускаємо авто-оновлення
-        if len(self.connected_clients) == 1:
+        if len(self.client_queues) == 1:
             await self.start_auto_refresh()
+        
+        return snapshot_sent
+    
+    def queue_initial(self, websocket: WebSocket, text: str, since_broadcast: int, compressible: bool = True) -> bool:
+        """Ставить початковий кадр у чергу клієнта (відправляє лише _client_writer)
+        
+        since_broadcast: broadcast_seq на момент запиту в БД; якщо відтоді була розсилка,
+        клієнт уже отримав новіші дані і кадр відкидається.
+        compressible: False → завжди JSON-текст (помилки), навіть для deflate-клієнта.
+        """
+        queue = self.client_queues.get(websocket)
+        if queue is None or self.broadcast_seq != since_broadcast:
+            return False
+        frame: Union[str, bytes] = text
+        if compressible and websocket in self.deflate_clients:
+            frame = zlib.compress(text.encode(), self.deflate_level)
+        queue.put_nowait(frame)
+        return True
     
     def remove_client(self, websocket: WebSocket):
         """Видаляє клієнта зі списку підключених"""
-        if websocket in self.connected_clients:
-            self.connected_clients.remove(websocket)
+        self.client_queues.pop(websocket, None)
+        self.deflate_clients.discard(websocket)
+        writer = self.client_writers.pop(websocket, None)
+        if writer and writer is not asyncio.current_task():
+            writer.cancel()
+    
+    async def _client_writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        """Відправляє повідомлення з черги конкретному клієнту"""
+        try:
+            while True:
+                frame = await queue.get()
+                if isinstance(frame, bytes):
+                    await websocket.send_bytes(frame)
+                else:
+                    await websocket.send_text(frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Відправка не вдалась → клієнт відключився
+            self.remove_client(websocket)
     
     async def start_auto_refresh(self):
         """Запускає авто-оновлення для всіх клієнтів"""
-        if self.auto_refresh_task is None:
-            self.auto_refresh_task = asyncio.create_task(self._auto_refresh_loop())
+        if self.listener_conn is None:
+            await self._connect_listener()
             # if self.debug:
-                # print(f"✅ Auto-refresh started (every {self.refresh_interval}s)")
+                # print("✅ Auto-refresh started (LISTEN token_change)")
+        if self.watchdog_task is None:
+            self.watchdog_task = asyncio.create_task(self._watchdog_loop())
+    
+    async def _connect_listener(self):
+        """Бере з'єднання з пулу і підписується на token_change"""
+        pool = await get_db_pool()
+        conn = await pool.acquire()
+        try:
+            await conn.add_listener('token_change', self._on_token_change)
+            conn.add_termination_listener(self._on_listener_terminated)
+            has_trigger = await conn.fetchval(NOTIFY_TRIGGER_SQL)
+        except Exception:
+            await pool.release(conn)
+            raise
+        self.listener_conn = conn
+        if not has_trigger:
+            print("⚠️ token_ids_notify_change trigger is missing: token list refreshes only by polling "
+                  f"(every {self.watchdog_interval:g}s)")
+    
+    async def _release_listener(self):
+        """Знімає LISTEN і повертає з'єднання в пул"""
+        conn, self.listener_conn = self.listener_conn, None
+        if conn is None:
+            return
+        try:
+            conn.remove_termination_listener(self._on_listener_terminated)
+            await conn.remove_listener('token_change', self._on_token_change)
+        finally:
+            pool = await get_db_pool()
+            await pool.release(conn)
+    
+    def _on_listener_terminated(self, connection):
+        """Callback asyncpg: з'єднання під LISTEN закрилось — watchdog перепідключиться"""
+        if connection is self.listener_conn:
+            # Закрите з'єднання пул забирає сам (proxy від'єднується), release не потрібен
+            self.listener_conn = None
+            print("⚠️ Token LISTEN connection lost, reconnecting...")
+            # Будимо watchdog одразу, не чекаючи кінця інтервалу
+            self.watchdog_wakeup.set()
+    
+    async def _watchdog_sleep(self):
+        """Пауза на інтервал або до сигналу про розрив LISTEN"""
+        try:
+            await asyncio.wait_for(self.watchdog_wakeup.wait(), self.watchdog_interval)
+        except asyncio.TimeoutError:
+            pass
+        self.watchdog_wakeup.clear()
+    
+    async def _watchdog_loop(self):
+        """Перепідключення LISTEN + резервне опитування змін, поки є клієнти"""
+        try:
+            while True:
+                await self._watchdog_sleep()
+                try:
+                    if self.listener_conn is None:
+                        await self._connect_listener()
+                        # NOTIFY за час розриву загублені — оновлюємо без умов
+                        self.last_probe = None
+                        self._request_refresh()
+                    
+                    pool = await get_db_pool()
+                    probe = tuple(await pool.fetchrow(CHANGE_PROBE_SQL))
+                    # NOTIFY доходять — LISTEN працює, опитування лише запам'ятовує стан
+                    if not self.notify_seen and self.last_probe is not None and probe != self.last_probe:
+                        self._request_refresh()
+                    self.notify_seen = False
+                    self.last_probe = probe
+                except Exception as e:
+                    print(f"❌ Token auto-refresh watchdog error: {e}")
+        except asyncio.CancelledError:
+            pass
     
     async def stop_auto_refresh(self):
         """Зупиняє авто-оновлення"""
-        if self.auto_refresh_task:
-            self.auto_refresh_task.cancel()
+        if self.watchdog_task:
+            self.watchdog_task.cancel()
+            await self.watchdog_task
+            self.watchdog_task = None
+        self.last_probe = None
+        self.notify_seen = False
+        
+        if self.broadcast_task:
+            self.broadcast_task.cancel()
             try:
-                await self.auto_refresh_task
+                await self.broadcast_task
             except asyncio.CancelledError:
                 pass
-            self.auto_refresh_task = None
+            self.broadcast_task = None
+        self.refresh_pending = False
             # if self.debug:
                 # print("🛑 Auto-refresh stopped")
+        
+        # Без LISTEN кеш більше не інвалідується
+        self.last_frames = {}
+        self.last_payload_at = None
+        
+        await self._release_listener()
     
-    async def _auto_refresh_loop(self):
-        """Періодично перевіряє БД і відправляє оновлення ТІЛЬКИ якщо є зміни (PostgreSQL)"""
-        while True:
-            try:
-                await asyncio.sleep(self.refresh_interval)
+    def _on_token_change(self, connection, pid, channel, payload):
+        """Callback asyncpg на NOTIFY token_change"""
+        self.notify_seen = True
+        self._request_refresh()
+    
+    def _request_refresh(self):
+        """Інвалідує кеш і планує розсилку (NOTIFY або резервне опитування)"""
+        # Кеш застарів — наступний клієнт отримає свіжі дані
+        self.last_frames = {}
+        self.last_payload_at = None
+        
+        # Пачка NOTIFY зливається в одну розсилку: задача одна на всю пачку
+        self.refresh_pending = True
+        if self.broadcast_task is None:
+            self.broadcast_task = asyncio.create_task(self._debounced_broadcast())
+    
+    def _frame(self, frames: Dict[bool, Union[str, bytes]], deflate: bool) -> Union[str, bytes]:
+        """Кадр потрібного виду; zlib рахується не більше одного разу на розсилку"""
+        frame = frames.get(deflate)
+        if frame is None:
+            frame = frames[True] = zlib.compress(frames[False].encode(), self.deflate_level)
+        return frame
+    
+    def _broadcast(self, frames: Dict[bool, Union[str, bytes]]):
+        """Кладе одні й ті самі закодовані кадри у черги всіх клієнтів"""
+        self.broadcast_seq += 1
+        for websocket, queue in self.client_queues.items():
+            if queue.full():
+                # Кожен payload — повний знімок, тому найстаріший можна викинути
+                queue.get_nowait()
+            queue.put_nowait(self._frame(frames, websocket in self.deflate_clients))
+    
+    async def _debounced_broadcast(self):
+        """Після короткого вікна тиші читає токени і розсилає їх (PostgreSQL)"""
+        try:
+            while self.refresh_pending:
+                # Зміни, що прийдуть за цей час, потраплять у ту саму розсилку
+                await asyncio.sleep(self.notify_debounce)
+                self.refresh_pending = False
                 
-                if not self.connected_clients:
+                if not self.client_queues:
                     continue
                 
-                # Перевіряємо COUNT та MAX(updated_at) для виявлення будь-яких змін
-                pool = await get_db_pool()
-                async with pool.acquire() as conn:
-                    row = await conn.fetchrow("""
-                        SELECT COUNT(*) as count, MAX(updated_at) as last_updated
-                        FROM token_ids
-                    """)
-                    current_count = row['count']
-                    current_updated_at = row['last_updated']
+                # Запит на тому ж довгоживучому з'єднанні, що й LISTEN (без acquire/release з пулу);
+                # поки watchdog перепідключається (listener_conn is None) — з пулу
+                # total_count потрібен frontend-у (лічильник токенів), оцінка з pg_class — O(1)
+                result = await self.get_tokens_from_db(limit=1000, conn=self.listener_conn, include_total=True)
                 
-                # Якщо кількість змінилась АБО updated_at новіший → оновлюємо frontend
-                has_changes = (
-                    current_count != self.last_token_count or 
-                    (current_updated_at and current_updated_at != self.last_updated_at)
-                )
-                
-                if has_changes:
-                    result = await self.get_tokens_from_db(limit=1000)
+                if result["success"] and result["tokens"]:
+                    # orjson: серіалізує datetime нативно, значно швидше за json.dumps
+                    frames = {False: orjson.dumps(result).decode()}
                     
-                    if result["success"] and result["tokens"]:
-                        json_data = json.dumps(result, ensure_ascii=False)
-                        
-                        disconnected_clients = []
-                        for client in self.connected_clients:
-                            try:
-                                await client.send_text(json_data)
-                            except Exception as e:
-                                disconnected_clients.append(client)
-                        
-                        for client in disconnected_clients:
-                            self.connected_clients.remove(client)
-                        
-                        self.last_token_count = current_count
-                        self.last_updated_at = current_updated_at
-                        
-                        # if self.debug:
-                            # print(f"📡 DB changed! Sent {len(result['tokens'])} tokens to {len(self.connected_clients)} clients")
-                # else:
-                    # if self.debug:
-                        # print(f"ℹ️  No changes in DB ({current_count} tokens)")
+                    self._broadcast(frames)
                     
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                if self.debug:
-                    print(f"❌ Auto-refresh error: {e}")
+                    # NOTIFY, що прийшов під час запиту, знову виставив refresh_pending —
+                    # такий знімок міг застаріти, тож не кешуємо його
+                    if not self.refresh_pending:
+                        self.last_frames = frames
+                        self.last_payload_at = datetime.now()
+                    
+                    # if self.debug:
+                        # print(f"📡 DB changed! Sent {len(result['tokens'])} tokens to {len(self.client_queues)} clients")
+        except Exception as e:
+            if self.debug:
+                print(f"❌ Auto-refresh error: {e}")
+        finally:
+            self.broadcast_task = None
     
     def get_status(self):
         """Повертає статус читача (PostgreSQL)"""
         return {
-            "connected_clients": len(self.connected_clients),
+            "connected_clients": len(self.client_queues),
             "database": "PostgreSQL",
             "debug": self.debug,
-            "auto_refresh_running": self.auto_refresh_task is not None
+            "auto_refresh_running": self.watchdog_task is not None,
+            "listener_connected": self.listener_conn is not None,
+            "cached_payload_at": self.last_payload_at.isoformat() if self.last_payload_at else None
         }
 
 if __name__ == "__main__":
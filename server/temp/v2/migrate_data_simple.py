@@ -5,38 +5,91 @@
 
 import asyncio
 import sqlite3
+from array import array
 import asyncpg
 from datetime import datetime
 from db_config import POSTGRES_CONFIG
 
+TOKEN_COLUMNS = (
+    'id', 'token_address', 'token_pair', 'name', 'symbol', 'icon', 'decimals', 'dev',
+    'circ_supply', 'total_supply', 'token_program', 'holder_count',
+    'usd_price', 'liquidity', 'fdv', 'mcap', 'price_block_id',
+    'organic_score', 'organic_score_label',
+    'check_jupiter', 'history_ready', 'created_at'
+)
+
+TRADE_COLUMNS = (
+    'id', 'token_id', 'signature', 'timestamp', 'readable_time', 'direction',
+    'amount_tokens', 'amount_sol', 'amount_usd', 'token_price_usd', 'created_at'
+)
+
+TRADES_BATCH_SIZE = 50000
+
+def parse_created_at(value):
+    """SQLite ISO-рядок → datetime (або None)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+async def init_codecs(conn):
+    """BOOLEAN кодується драйвером з будь-якого truthy-значення SQLite (0/1) — без bool() на кожен рядок"""
+    await conn.set_type_codec(
+        'bool', encoder=lambda v: b'\x01' if v else b'\x00', decoder=lambda b: b != b'\x00',
+        schema='pg_catalog', format='binary'
+    )
+
+def _int_column(values: list):
+    """array('q') для цілочисельної колонки пачки; якщо є NULL — список як є (NULL іде в COPY без змін)"""
+    try:
+        return array('q', values)
+    except TypeError:
+        return values
+
+def iter_trade_batches(cursor, batch_size: int = TRADES_BATCH_SIZE):
+    """
+    Читає trades з SQLite-курсора пачками для COPY (без fetchall).
+    Цілочисельні колонки пачки тримаються в array('q') (8 байт на значення),
+    пачка з NULL у колонці лишає її списком; рядки для COPY збираються ліниво через zip.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        ids = _int_column([row[0] for row in rows])
+        token_ids = _int_column([row[1] for row in rows])
+        timestamps = _int_column([row[3] for row in rows])
+        signatures = [row[2] for row in rows]
+        rest = [row[4:10] for row in rows]
+        created = [parse_created_at(row[10]) for row in rows]
+        del rows
+        yield len(ids), (
+            (i, t, sig, ts, *r, c)
+            for i, t, sig, ts, r, c in zip(ids, token_ids, signatures, timestamps, rest, created)
+        )
+
 async def migrate_data():
     print("🚀 Початок міграції даних...")
     
-    # 1. Вигружаємо дані з SQLite в пам'ять
+    # 1. Вигружаємо токени з SQLite в пам'ять (trades читаються потоково на кроці 4)
     print("📥 Вигружаємо дані з SQLite...")
     sqlite_conn = sqlite3.connect("db/tokens.db")
-    sqlite_conn.row_factory = sqlite3.Row
+    # Джерело лише читається: заборона запису, блокування тримається до кінця, 4 GB mmap замість pread()
+    sqlite_conn.execute("PRAGMA query_only=1")
+    sqlite_conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    sqlite_conn.execute("PRAGMA mmap_size=4294967296")
     
-    # Отримуємо токени
+    # Отримуємо токени (звичайні кортежі, порядок SELECT = TOKEN_COLUMNS)
     cursor = sqlite_conn.execute("""
         SELECT 
-            ti.id, ti.token_address, ti.token_pair, ti.check_jupiter, ti.history_ready,
+            ti.id, ti.token_address, ti.token_pair,
             t.name, t.symbol, t.icon, t.decimals, t.dev, t.circ_supply, t.total_supply,
             t.token_program, t.holder_count, t.usd_price, t.liquidity, t.fdv, t.mcap,
-            t.price_block_id, t.organic_score, t.organic_score_label, ti.created_at
+            t.price_block_id, t.organic_score, t.organic_score_label,
+            ti.check_jupiter, ti.history_ready, ti.created_at
         FROM token_ids ti
         LEFT JOIN tokens t ON ti.id = t.token_id
     """)
     tokens_data = cursor.fetchall()
     print(f"📊 Завантажено {len(tokens_data)} токенів")
     
-    # Отримуємо trades
-    cursor = sqlite_conn.execute("SELECT * FROM trades")
-    trades_data = cursor.fetchall()
-    print(f"📈 Завантажено {len(trades_data)} trades")
-    
-    sqlite_conn.close()
-    
     # 2. Підключаємося до PostgreSQL
     print("🔌 Підключаємося до PostgreSQL...")
     postgres_config = POSTGRES_CONFIG.copy()
@@ -45,57 +98,32 @@ async def migrate_data():
     postgres_config.pop('max_size', None)
     
     postgres_conn = await asyncpg.connect(**postgres_config)
+    await init_codecs(postgres_conn)
     
     try:
-        # Очищаємо таблиці
-        await postgres_conn.execute('DELETE FROM trades')
-        await postgres_conn.execute('DELETE FROM tokens')
-        print("🧹 Очищено таблиці")
-        
-        # 3. Вставляємо токени
-        print("📦 Вставляємо токени...")
-        for row in tokens_data:
-            await postgres_conn.execute("""
-                INSERT INTO tokens (
-                    id, token_address, token_pair, name, symbol, icon, decimals, dev,
-                    circ_supply, total_supply, token_program, holder_count,
-                    usd_price, liquidity, fdv, mcap, price_block_id,
-                    organic_score, organic_score_label,
-                    check_jupiter, history_ready, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12,
-                    $13, $14, $15, $16, $17, $18, $19, $20, $21, $22
-                )
-            """, 
-                row['id'], row['token_address'], row['token_pair'], 
-                row['name'], row['symbol'], row['icon'], row['decimals'], row['dev'],
-                row['circ_supply'], row['total_supply'], row['token_program'], row['holder_count'],
-                row['usd_price'], row['liquidity'], row['fdv'], row['mcap'], row['price_block_id'],
-                row['organic_score'], row['organic_score_label'],
-                row['check_jupiter'], bool(row['history_ready']), 
-                datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')) if row['created_at'] else None
-            )
-        
-        print(f"✅ Вставлено {len(tokens_data)} токенів")
-        
-        # 4. Вставляємо trades
-        print("📈 Вставляємо trades...")
-        for row in trades_data:
-            await postgres_conn.execute("""
-                INSERT INTO trades (
-                    id, token_id, signature, timestamp, readable_time, direction,
-                    amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11
-                )
-            """, 
-                row['id'], row['token_id'], row['signature'], row['timestamp'], 
-                row['readable_time'], row['direction'], row['amount_tokens'], 
-                row['amount_sol'], row['amount_usd'], row['token_price_usd'], 
-                datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')) if row['created_at'] else None
-            )
-        
-        print(f"✅ Вставлено {len(trades_data)} trades")
+        # Один COPY на таблицю замість INSERT на кожен рядок; все в одній транзакції
+        async with postgres_conn.transaction():
+            # Очищаємо таблиці
+            await postgres_conn.execute('DELETE FROM trades')
+            await postgres_conn.execute('DELETE FROM tokens')
+            print("🧹 Очищено таблиці")
+            
+            # 3. Вставляємо токени
+            print("📦 Вставляємо токени...")
+            token_records = [(*row[:21], parse_created_at(row[21])) for row in tokens_data]
+            await postgres_conn.copy_records_to_table('tokens', records=token_records, columns=TOKEN_COLUMNS)
+            
+            print(f"✅ Вставлено {len(tokens_data)} токенів")
+            
+            # 4. Вставляємо trades пачками прямо з SQLite-курсора (пам'ять = одна пачка)
+            print("📈 Вставляємо trades...")
+            trades_count = 0
+            cursor = sqlite_conn.execute(f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades")
+            for batch_len, records in iter_trade_batches(cursor):
+                await postgres_conn.copy_records_to_table('trades', records=records, columns=TRADE_COLUMNS)
+                trades_count += batch_len
+            
+            print(f"✅ Вставлено {trades_count} trades")
         
         # 5. Валідація
         print("🔍 Валідація...")
@@ -104,12 +132,13 @@ async def migrate_data():
         
         print(f"📊 PostgreSQL: {postgres_tokens} токенів, {postgres_trades} trades")
         
-        if postgres_tokens == len(tokens_data) and postgres_trades == len(trades_data):
+        if postgres_tokens == len(tokens_data) and postgres_trades == trades_count:
             print("✅ Міграція завершена успішно!")
         else:
             print("❌ Помилка валідації!")
             
     finally:
+        sqlite_conn.close()
         await postgres_conn.close()
 
 if __name__ == "__main__":
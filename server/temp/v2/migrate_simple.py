@@ -6,14 +6,73 @@
 import asyncio
 import sqlite3
 import asyncpg
+import uvloop
+from datetime import datetime
 from db_config import POSTGRES_CONFIG
 
+TOKEN_COLUMNS = (
+    'id', 'token_address', 'token_pair', 'name', 'symbol', 'icon', 'decimals', 'dev',
+    'circ_supply', 'total_supply', 'token_program', 'holder_count',
+    'usd_price', 'liquidity', 'fdv', 'mcap', 'price_block_id',
+    'organic_score', 'organic_score_label',
+    'check_jupiter', 'history_ready', 'created_at'
+)
+
+TRADE_COLUMNS = (
+    'id', 'token_id', 'signature', 'timestamp', 'readable_time', 'direction',
+    'amount_tokens', 'amount_sol', 'amount_usd', 'token_price_usd', 'created_at'
+)
+
+BATCH_SIZE = 10_000
+MULTIROW_SLAB = 500  # рядків на один multi-row INSERT (22 колонки × 500 < 32767 параметрів)
+
+def parse_created_at(value):
+    """SQLite ISO-рядок → datetime (або None)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+async def init_codecs(conn):
+    """BOOLEAN кодується драйвером з будь-якого truthy-значення SQLite (0/1) — без bool() на кожен рядок"""
+    await conn.set_type_codec(
+        'bool', encoder=lambda v: b'\x01' if v else b'\x00', decoder=lambda b: b != b'\x00',
+        schema='pg_catalog', format='binary'
+    )
+
+def build_multirow_insert(table: str, cols, n_rows: int) -> str:
+    """INSERT INTO table (cols) VALUES ($1,...,$k), ($k+1,...), ... на n_rows рядків"""
+    k = len(cols)
+    values = ', '.join(
+        '(' + ', '.join(f'${i * k + j + 1}' for j in range(k)) + ')'
+        for i in range(n_rows)
+    )
+    return f"INSERT INTO {table} ({', '.join(cols)}) VALUES {values}"
+
+async def insert_multirow(conn, table: str, cols, records, slab: int = MULTIROW_SLAB):
+    """Вставляє records шматками по slab рядків: один execute (parse+plan) на шматок"""
+    full_sql = build_multirow_insert(table, cols, slab)
+    for start in range(0, len(records), slab):
+        chunk = records[start:start + slab]
+        sql = full_sql if len(chunk) == slab else build_multirow_insert(table, cols, len(chunk))
+        await conn.execute(sql, *[value for record in chunk for value in record])
+
+def iter_batches(cursor, batch_size: int = BATCH_SIZE):
+    """Читає SQLite-курсор пачками через fetchmany (без fetchall усієї таблиці)"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
 async def migrate():
     print("🚀 Початок спрощеної міграції...")
     
     # Підключаємося до SQLite
     sqlite_conn = sqlite3.connect("db/tokens.db")
-    sqlite_conn.row_factory = sqlite3.Row
+    # Джерело лише читається: заборона запису, блокування тримається до кінця, 4 GB mmap замість pread()
+    sqlite_conn.execute("PRAGMA query_only=1")
+    sqlite_conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    sqlite_conn.execute("PRAGMA mmap_size=4294967296")
+    # 256 MB page cache для потокового читання
+    sqlite_conn.execute("PRAGMA cache_size=-262144")
     
     # Підключаємося до PostgreSQL
     postgres_config = POSTGRES_CONFIG.copy()
@@ -21,72 +80,49 @@ async def migrate():
     postgres_config.pop('min_size', None)
     postgres_config.pop('max_size', None)
     
-    postgres_conn = await asyncpg.connect(**postgres_config)
+    # Більший кеш prepared statements: multi-row INSERT різних розмірів не витісняють один одного
+    postgres_conn = await asyncpg.connect(**postgres_config, statement_cache_size=1024)
+    await init_codecs(postgres_conn)
     
     try:
-        # Очищаємо таблиці
-        await postgres_conn.execute('DELETE FROM trades')
-        await postgres_conn.execute('DELETE FROM tokens')
-        
-        # Мігруємо токени
-        print("📦 Мігруємо токени...")
-        cursor = sqlite_conn.execute("""
-            SELECT 
-                ti.id, ti.token_address, ti.token_pair, ti.check_jupiter, ti.history_ready,
-                t.name, t.symbol, t.icon, t.decimals, t.dev, t.circ_supply, t.total_supply,
-                t.token_program, t.holder_count, t.usd_price, t.liquidity, t.fdv, t.mcap,
-                t.price_block_id, t.organic_score, t.organic_score_label, ti.created_at
-            FROM token_ids ti
-            LEFT JOIN tokens t ON ti.id = t.token_id
-        """)
-        
-        rows = cursor.fetchall()
-        print(f"📊 Знайдено {len(rows)} токенів")
-        
-        for row in rows:
-            await postgres_conn.execute("""
-                INSERT INTO tokens (
-                    id, token_address, token_pair, name, symbol, icon, decimals, dev,
-                    circ_supply, total_supply, token_program, holder_count,
-                    usd_price, liquidity, fdv, mcap, price_block_id,
-                    organic_score, organic_score_label,
-                    check_jupiter, history_ready, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12,
-                    $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24
-                )
-            """, 
-                row['id'], row['token_address'], row['token_pair'], 
-                row['name'], row['symbol'], row['icon'], row['decimals'], row['dev'],
-                row['circ_supply'], row['total_supply'], row['token_program'], row['holder_count'],
-                row['usd_price'], row['liquidity'], row['fdv'], row['mcap'], row['price_block_id'],
-                row['organic_score'], row['organic_score_label'],
-                row['check_jupiter'], bool(row['history_ready']), row['created_at']
-            )
-        
-        print(f"✅ Мігровано {len(rows)} токенів")
-        
-        # Мігруємо trades
-        print("📈 Мігруємо trades...")
-        cursor = sqlite_conn.execute("SELECT * FROM trades")
-        rows = cursor.fetchall()
-        print(f"📊 Знайдено {len(rows)} trades")
-        
-        for row in rows:
-            await postgres_conn.execute("""
-                INSERT INTO trades (
-                    id, token_id, signature, timestamp, readable_time, direction,
-                    amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11
-                )
-            """, 
-                row['id'], row['token_id'], row['signature'], row['timestamp'], 
-                row['readable_time'], row['direction'], row['amount_tokens'], 
-                row['amount_sol'], row['amount_usd'], row['token_price_usd'], row['created_at']
-            )
-        
-        print(f"✅ Мігровано {len(rows)} trades")
+        # Пачки по BATCH_SIZE (токени — multi-row INSERT, trades — binary COPY); все в одній транзакції
+        async with postgres_conn.transaction():
+            # Очищаємо таблиці (TRUNCATE замість DELETE: без запису кожного рядка у WAL)
+            await postgres_conn.execute('TRUNCATE tokens, trades RESTART IDENTITY CASCADE')
+            
+            # Мігруємо токени
+            print("📦 Мігруємо токени...")
+            # Звичайні кортежі замість sqlite3.Row: порядок SELECT = TOKEN_COLUMNS
+            cursor = sqlite_conn.execute("""
+                SELECT 
+                    ti.id, ti.token_address, ti.token_pair,
+                    t.name, t.symbol, t.icon, t.decimals, t.dev, t.circ_supply, t.total_supply,
+                    t.token_program, t.holder_count, t.usd_price, t.liquidity, t.fdv, t.mcap,
+                    t.price_block_id, t.organic_score, t.organic_score_label,
+                    ti.check_jupiter, ti.history_ready, ti.created_at
+                FROM token_ids ti
+                LEFT JOIN tokens t ON ti.id = t.token_id
+            """)
+            
+            tokens_count = 0
+            for rows in iter_batches(cursor):
+                records = [(*row[:21], parse_created_at(row[21])) for row in rows]
+                # Токенів небагато — multi-row VALUES замість COPY
+                await insert_multirow(postgres_conn, 'tokens', TOKEN_COLUMNS, records)
+                tokens_count += len(records)
+            
+            print(f"✅ Мігровано {tokens_count} токенів")
+            
+            # Мігруємо trades
+            print("📈 Мігруємо trades...")
+            cursor = sqlite_conn.execute(f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades")
+            trades_count = 0
+            for rows in iter_batches(cursor):
+                records = [(*row[:10], parse_created_at(row[10])) for row in rows]
+                await postgres_conn.copy_records_to_table('trades', records=records, columns=TRADE_COLUMNS)
+                trades_count += len(records)
+            
+            print(f"✅ Мігровано {trades_count} trades")
         
         # Валідація
         sqlite_count = sqlite_conn.execute("SELECT COUNT(*) FROM token_ids").fetchone()[0]
@@ -108,4 +144,6 @@ async def migrate():
         await postgres_conn.close()
 
 if __name__ == "__main__":
+    # libuv-цикл замість стандартного selector-циклу
+    uvloop.install()
     asyncio.run(migrate())
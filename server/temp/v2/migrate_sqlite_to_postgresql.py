@@ -6,9 +6,33 @@
 import asyncio
 import sqlite3
 import asyncpg
+import uvloop
 from db_config import POSTGRES_CONFIG
 from datetime import datetime
 
+BATCH_SIZE = 10_000
+
+def iter_batches(cursor, batch_size: int = BATCH_SIZE):
+    """Читає SQLite-курсор пачками через fetchmany (без fetchall усієї таблиці)"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+async def init_codecs(conn):
+    """
+    Конвертації SQLite → PostgreSQL робить драйвер при кодуванні:
+    BOOLEAN з 0/1, NUMERIC прямо з рядка/числа SQLite (без bool()/float() на кожен рядок)
+    """
+    await conn.set_type_codec(
+        'bool', encoder=lambda v: b'\x01' if v else b'\x00', decoder=lambda b: b != b'\x00',
+        schema='pg_catalog', format='binary'
+    )
+    await conn.set_type_codec(
+        'numeric', encoder=str, decoder=float, schema='pg_catalog', format='text'
+    )
+
 class SQLiteToPostgreSQLMigrator:
     def __init__(self):
         self.sqlite_path = "db/tokens.db"
@@ -17,161 +41,150 @@ class SQLiteToPostgreSQLMigrator:
         self.postgres_config.pop('min_size', None)
         self.postgres_config.pop('max_size', None)
     
+    def connect_sqlite(self):
+        """Окреме read-only підключення до SQLite (по одному на кожну паралельну задачу)"""
+        # check_same_thread=False: COUNT-и валідації виконуються в потоках executor-а
+        sqlite_conn = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+        sqlite_conn.execute("PRAGMA query_only=1")
+        # 4 GB mmap замість pread() на кожну сторінку; locking_mode=EXCLUSIVE тут не ставимо —
+        # два читачі одного файлу заблокували б один одного в WAL-режимі
+        sqlite_conn.execute("PRAGMA mmap_size=4294967296")
+        # 256 MB page cache для потокового читання
+        sqlite_conn.execute("PRAGMA cache_size=-262144")
+        return sqlite_conn
+    
     async def migrate(self):
         """Основна функція міграції"""
         print("🚀 Початок міграції з SQLite в PostgreSQL...")
         
-        # Підключаємося до SQLite
-        sqlite_conn = sqlite3.connect(self.sqlite_path)
-        sqlite_conn.row_factory = sqlite3.Row
+        # Підключаємося до SQLite: окреме з'єднання для токенів і для trades (валідація рахує їх паралельно)
+        tokens_sqlite = self.connect_sqlite()
+        trades_sqlite = self.connect_sqlite()
         
-        # Підключаємося до PostgreSQL
-        postgres_conn = await asyncpg.connect(**self.postgres_config)
+        # Підключаємося до PostgreSQL: два з'єднання — для паралельних COUNT-ів валідації
+        pool = await asyncpg.create_pool(
+            **self.postgres_config, min_size=2, max_size=2, init=init_codecs, statement_cache_size=1024
+        )
         
         try:
-            # 1. Мігруємо токени
-            await self.migrate_tokens(sqlite_conn, postgres_conn)
-            
-            # 2. Мігруємо trades
-            await self.migrate_trades(sqlite_conn, postgres_conn)
+            # TRUNCATE і обидва завантаження — одна транзакція на одному з'єднанні: при помилці
+            # все відкочується, а trades бачать щойно вставлені tokens (FK trades.token_id не DEFERRABLE)
+            async with pool.acquire() as postgres_conn:
+                async with postgres_conn.transaction():
+                    # Міграція одноразова: очищаємо таблиці і пишемо простим INSERT без ON CONFLICT
+                    await postgres_conn.execute('TRUNCATE tokens, trades RESTART IDENTITY CASCADE')
+                    
+                    # 1. Мігруємо токени
+                    await self.migrate_tokens(tokens_sqlite, postgres_conn)
+                    
+                    # 2. Мігруємо trades
+                    await self.migrate_trades(trades_sqlite, postgres_conn)
             
             # 3. Валідація
-            await self.validate_migration(sqlite_conn, postgres_conn)
+            await self.validate_migration(tokens_sqlite, trades_sqlite, pool)
             
             print("✅ Міграція завершена успішно!")
             
         finally:
-            sqlite_conn.close()
-            await postgres_conn.close()
+            tokens_sqlite.close()
+            trades_sqlite.close()
+            await pool.close()
     
     async def migrate_tokens(self, sqlite_conn, postgres_conn):
         """Мігруємо токени з token_ids та tokens таблиць"""
         print("📦 Мігруємо токени...")
         
-        # Отримуємо дані з SQLite
-        sqlite_conn.execute("""
+        # Отримуємо дані з SQLite звичайними кортежами; порядок SELECT = порядок колонок INSERT
+        cursor = sqlite_conn.execute("""
             SELECT 
-                ti.id, ti.token_address, ti.token_pair, ti.check_jupiter, ti.history_ready,
+                ti.id, ti.token_address, ti.token_pair,
                 t.name, t.symbol, t.icon, t.decimals, t.dev, t.circ_supply, t.total_supply,
                 t.token_program, t.holder_count, t.usd_price, t.liquidity, t.fdv, t.mcap,
                 t.price_block_id, t.organic_score, t.organic_score_label,
                 NULL as mint_authority_disabled, NULL as freeze_authority_disabled,
-                NULL as top_holders_percentage, NULL as dev_balance_percentage, ti.created_at
+                NULL as top_holders_percentage, NULL as dev_balance_percentage,
+                ti.check_jupiter, ti.history_ready, ti.created_at
             FROM token_ids ti
             LEFT JOIN tokens t ON ti.id = t.token_id
         """)
         
-        rows = sqlite_conn.fetchall()
-        print(f"📊 Знайдено {len(rows)} токенів для міграції")
-        
-        # Вставляємо в PostgreSQL
-        for row in rows:
-            await postgres_conn.execute("""
-                INSERT INTO tokens (
-                    id, token_address, token_pair, name, symbol, icon, decimals, dev,
-                    circ_supply, total_supply, token_program, holder_count,
-                    usd_price, liquidity, fdv, mcap, price_block_id,
-                    organic_score, organic_score_label,
-                    mint_authority_disabled, freeze_authority_disabled,
-                    top_holders_percentage, dev_balance_percentage,
-                    check_jupiter, history_ready, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12,
-                    $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26, $27
-                )
-                ON CONFLICT (id) DO UPDATE SET
-                    token_address = EXCLUDED.token_address,
-                    token_pair = EXCLUDED.token_pair,
-                    name = EXCLUDED.name,
-                    symbol = EXCLUDED.symbol,
-                    icon = EXCLUDED.icon,
-                    decimals = EXCLUDED.decimals,
-                    dev = EXCLUDED.dev,
-                    circ_supply = EXCLUDED.circ_supply,
-                    total_supply = EXCLUDED.total_supply,
-                    token_program = EXCLUDED.token_program,
-                    holder_count = EXCLUDED.holder_count,
-                    usd_price = EXCLUDED.usd_price,
-                    liquidity = EXCLUDED.liquidity,
-                    fdv = EXCLUDED.fdv,
-                    mcap = EXCLUDED.mcap,
-                    price_block_id = EXCLUDED.price_block_id,
-                    organic_score = EXCLUDED.organic_score,
-                    organic_score_label = EXCLUDED.organic_score_label,
-                    mint_authority_disabled = EXCLUDED.mint_authority_disabled,
-                    freeze_authority_disabled = EXCLUDED.freeze_authority_disabled,
-                    top_holders_percentage = EXCLUDED.top_holders_percentage,
-                    dev_balance_percentage = EXCLUDED.dev_balance_percentage,
-                    check_jupiter = EXCLUDED.check_jupiter,
-                    history_ready = EXCLUDED.history_ready,
-                    created_at = EXCLUDED.created_at
-            """, 
-                row['id'], row['token_address'], row['token_pair'], 
-                row['name'], row['symbol'], row['icon'], row['decimals'], row['dev'],
-                row['circ_supply'], row['total_supply'], row['token_program'], row['holder_count'],
-                row['usd_price'], row['liquidity'], row['fdv'], row['mcap'], row['price_block_id'],
-                row['organic_score'], row['organic_score_label'],
-                row['mint_authority_disabled'], row['freeze_authority_disabled'],
-                row['top_holders_percentage'], row['dev_balance_percentage'],
-                row['check_jupiter'], row['history_ready'], row['created_at']
+        # Один prepared statement на всі пачки, Bind/Execute конвеєром (транзакція і TRUNCATE — у migrate())
+        stmt = await postgres_conn.prepare("""
+            INSERT INTO tokens (
+                id, token_address, token_pair, name, symbol, icon, decimals, dev,
+                circ_supply, total_supply, token_program, holder_count,
+                usd_price, liquidity, fdv, mcap, price_block_id,
+                organic_score, organic_score_label,
+                mint_authority_disabled, freeze_authority_disabled,
+                top_holders_percentage, dev_balance_percentage,
+                check_jupiter, history_ready, created_at
+            ) VALUES (
+                $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12,
+                $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26
             )
+        """)
+        
+        tokens_count = 0
+        for rows in iter_batches(cursor):
+            # Рядки йдуть в executemany як є, без перепакування
+            await stmt.executemany(rows)
+            tokens_count += len(rows)
         
-        print(f"✅ Мігровано {len(rows)} токенів")
+        print(f"✅ Мігровано {tokens_count} токенів")
     
     async def migrate_trades(self, sqlite_conn, postgres_conn):
         """Мігруємо trades"""
         print("📈 Мігруємо trades...")
         
-        # Отримуємо дані з SQLite
-        sqlite_conn.execute("SELECT * FROM trades")
-        rows = sqlite_conn.fetchall()
-        print(f"📊 Знайдено {len(rows)} trades для міграції")
+        # Отримуємо дані з SQLite; порядок SELECT = порядок колонок INSERT, '' → NULL ще в SQLite
+        cursor = sqlite_conn.execute("""
+            SELECT id, token_id, timestamp, NULLIF(amount_sol, ''), amount_tokens, NULLIF(amount_usd, ''),
+                   NULLIF(token_price_usd, ''), direction, signature, created_at
+            FROM trades
+        """)
         
-        # Вставляємо в PostgreSQL
-        for row in rows:
-            await postgres_conn.execute("""
-                INSERT INTO trades (
-                    id, token_id, timestamp, amount_sol, amount_tokens, amount_usd,
-                    token_price_usd, trade_type, signature, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10
-                )
-                ON CONFLICT (id) DO UPDATE SET
-                    token_id = EXCLUDED.token_id,
-                    timestamp = EXCLUDED.timestamp,
-                    amount_sol = EXCLUDED.amount_sol,
-                    amount_tokens = EXCLUDED.amount_tokens,
-                    amount_usd = EXCLUDED.amount_usd,
-                    token_price_usd = EXCLUDED.token_price_usd,
-                    trade_type = EXCLUDED.trade_type,
-                    signature = EXCLUDED.signature,
-                    created_at = EXCLUDED.created_at
-            """, 
-                row['id'], row['token_id'], row['timestamp'], 
-                float(row['amount_sol']) if row['amount_sol'] else None, 
-                row['amount_tokens'], 
-                float(row['amount_usd']) if row['amount_usd'] else None,
-                float(row['token_price_usd']) if row['token_price_usd'] else None, 
-                row['direction'], row['signature'], row['created_at']
+        stmt = await postgres_conn.prepare("""
+            INSERT INTO trades (
+                id, token_id, timestamp, amount_sol, amount_tokens, amount_usd,
+                token_price_usd, trade_type, signature, created_at
+            ) VALUES (
+                $1, $2, $3, $4, $5, $6, $7, $8, $9, $10
             )
+        """)
         
-        print(f"✅ Мігровано {len(rows)} trades")
+        trades_count = 0
+        for rows in iter_batches(cursor):
+            # NUMERIC кодує init_codecs — рядки йдуть в executemany як є
+            await stmt.executemany(rows)
+            trades_count += len(rows)
+        
+        print(f"✅ Мігровано {trades_count} trades")
     
-    async def validate_migration(self, sqlite_conn, postgres_conn):
-        """Валідація міграції"""
+    async def validate_migration(self, tokens_sqlite, trades_sqlite, pool, exact: bool = True):
+        """
+        Валідація міграції: 4 COUNT-и паралельно (SQLite — у потоках executor-а, по одному
+        з'єднанню на таблицю; PostgreSQL — на двох з'єднаннях пулу).
+        exact=False бере оцінку reltuples з pg_class замість повного скану в PostgreSQL.
+        """
         print("🔍 Валідація міграції...")
+        loop = asyncio.get_running_loop()
         
-        # Перевіряємо кількість токенів
-        sqlite_count = sqlite_conn.execute("SELECT COUNT(*) FROM token_ids").fetchone()[0]
-        postgres_count = await postgres_conn.fetchval("SELECT COUNT(*) FROM tokens")
+        if exact:
+            pg_tokens = pool.fetchval("SELECT COUNT(*) FROM tokens")
+            pg_trades = pool.fetchval("SELECT COUNT(*) FROM trades")
+        else:
+            pg_tokens = pool.fetchval("SELECT reltuples::bigint FROM pg_class WHERE relname = 'tokens'")
+            pg_trades = pool.fetchval("SELECT reltuples::bigint FROM pg_class WHERE relname = 'trades'")
+        
+        sqlite_count, sqlite_trades, postgres_count, postgres_trades = await asyncio.gather(
+            loop.run_in_executor(None, lambda: tokens_sqlite.execute("SELECT COUNT(*) FROM token_ids").fetchone()[0]),
+            loop.run_in_executor(None, lambda: trades_sqlite.execute("SELECT COUNT(*) FROM trades").fetchone()[0]),
+            pg_tokens,
+            pg_trades
+        )
         
         print(f"📊 SQLite токенів: {sqlite_count}")
         print(f"📊 PostgreSQL токенів: {postgres_count}")
-        
-        # Перевіряємо кількість trades
-        sqlite_trades = sqlite_conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
-        postgres_trades = await postgres_conn.fetchval("SELECT COUNT(*) FROM trades")
-        
         print(f"📈 SQLite trades: {sqlite_trades}")
         print(f"📈 PostgreSQL trades: {postgres_trades}")
         
@@ -185,4 +198,6 @@ async def main():
     await migrator.migrate()
 
 if __name__ == "__main__":
+    # libuv-цикл замість стандартного selector-циклу
+    uvloop.install()
     asyncio.run(main())
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import sqlite3
-import shutil
 from datetime import datetime
 import os
 from typing import Dict, Any, List, Tuple
@@ -25,27 +24,48 @@ class DBMigrator:
     def create_backup(self):
         """Створює бекап старої БД"""
         self.log(f"\n{'='*80}\n📦 Creating backup of tokens.db...")
-        shutil.copy2(self.old_db_path, self.backup_path)
+        # SQLite Online Backup API: копіює сторінками по 1000 і консистентний навіть при паралельному записі
+        src = sqlite3.connect(self.old_db_path)
+        dst = sqlite3.connect(self.backup_path)
+        try:
+            src.backup(dst, pages=1000)
+        finally:
+            dst.close()
+            src.close()
         self.log(f"✅ Backup created: {self.backup_path}")
     
     def connect_dbs(self):
         """Підключається до обох БД"""
         self.log(f"\n{'='*80}\n🔌 Connecting to databases...")
+        # Звичайні кортежі (row_factory за замовчуванням) — без sqlite3.Row на кожен рядок
         self.old_conn = sqlite3.connect(self.old_db_path)
-        self.old_conn.row_factory = sqlite3.Row
+        self.old_conn.execute("PRAGMA query_only=1")
         
         # Створюємо нову БД якщо не існує
         self.new_conn = sqlite3.connect(self.new_db_path)
-        self.new_conn.row_factory = sqlite3.Row
+        
+        # Стару БД підключаємо до нової: дані копіюються всередині SQLite, без Python-рядків
+        self.new_conn.execute("ATTACH DATABASE ? AS old", (self.old_db_path,))
+        # 256 MB page cache для читання старої БД
+        self.new_conn.execute("PRAGMA old.cache_size=-262144")
+        # 4 GB mmap для читання старої БД замість pread() на кожну сторінку
+        self.new_conn.execute("PRAGMA old.mmap_size=4294967296")
+        
+        # Нова БД будується з нуля: fsync не потрібен, тимчасові дані в пам'яті.
+        # Тільки main.: прагма без схеми діє і на підключену old (вона стала б WAL назавжди)
+        self.new_conn.execute("PRAGMA main.journal_mode=WAL")
+        self.new_conn.execute("PRAGMA main.synchronous=OFF")
+        self.new_conn.execute("PRAGMA temp_store=MEMORY")
+        self.new_conn.execute("PRAGMA main.mmap_size=1073741824")
         self.log("✅ Connected to both databases")
     
     def create_new_schema(self):
         """Створює схему нової БД"""
         self.log(f"\n{'='*80}\n📝 Creating new database schema...")
         
-        # Видаляємо таблиці якщо існують
-        self.new_conn.execute("DROP TABLE IF EXISTS trades")
-        self.new_conn.execute("DROP TABLE IF EXISTS tokens")
+        # Видаляємо таблиці якщо існують (main. — щоб не зачепити таблиці підключеної old)
+        self.new_conn.execute("DROP TABLE IF EXISTS main.trades")
+        self.new_conn.execute("DROP TABLE IF EXISTS main.tokens")
         
         self.new_conn.executescript("""
             -- Основна таблиця токенів
@@ -148,25 +168,42 @@ class DBMigrator:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (token_id) REFERENCES tokens(id)
             );
-            
-            -- Критичні індекси
-            CREATE INDEX idx_tokens_address ON tokens(token_address);
-            CREATE INDEX idx_tokens_check_jupiter ON tokens(check_jupiter);
-            
-            CREATE INDEX idx_trades_token_id ON trades(token_id);
-            CREATE INDEX idx_trades_signature ON trades(signature);
-            CREATE INDEX idx_trades_timestamp ON trades(timestamp);
         """)
         
         self.log("✅ Created new database schema")
     
+    def create_indexes(self):
+        """Створює індекси після завантаження даних (один послідовний build замість оновлення на кожен INSERT)"""
+        self.log(f"\n{'='*80}\n🗂️ Creating indexes...")
+        
+        # 512 MB кешу під сортування при побудові індексів
+        self.new_conn.execute("PRAGMA cache_size=-524288")
+        
+        # Критичні індекси (по одному execute: executescript закомітив би поточну транзакцію)
+        for ddl in (
+            "CREATE INDEX idx_tokens_address ON tokens(token_address)",
+            "CREATE INDEX idx_tokens_check_jupiter ON tokens(check_jupiter)",
+            "CREATE INDEX idx_trades_token_id ON trades(token_id)",
+            "CREATE INDEX idx_trades_signature ON trades(signature)",
+            "CREATE INDEX idx_trades_timestamp ON trades(timestamp)",
+        ):
+            self.new_conn.execute(ddl)
+        
+        self.log("✅ Created indexes")
+    
     def migrate_tokens(self):
         """Міграція базових даних токенів"""
         self.log(f"\n{'='*80}\n📊 Migrating token data...")
         
-        # 1. Базова інформація
-        # Спочатку отримуємо дані зі старої БД
-        old_data = self.old_conn.execute("""
+        # 1. Базова інформація: один INSERT ... SELECT зі старої БД
+        self.new_conn.execute("""
+            INSERT INTO tokens (
+                id, token_address, token_pair, name, symbol, icon, decimals, dev,
+                circ_supply, total_supply, token_program, holder_count,
+                usd_price, liquidity, fdv, mcap, price_block_id,
+                organic_score, organic_score_label,
+                check_jupiter, history_ready
+            )
             SELECT 
                 ti.id,
                 ti.token_address,
@@ -189,114 +226,74 @@ class DBMigrator:
                 t.organic_score_label,
                 ti.check_jupiter,
                 ti.history_ready
-            FROM token_ids ti
-            LEFT JOIN tokens t ON t.token_id = ti.id
-        """).fetchall()
-        
-        # Потім вставляємо в нову БД
-        for row in old_data:
-            self.new_conn.execute("""
-                INSERT INTO tokens (
-                    id, token_address, token_pair, name, symbol, icon, decimals, dev,
-                    circ_supply, total_supply, token_program, holder_count,
-                    usd_price, liquidity, fdv, mcap, price_block_id,
-                    organic_score, organic_score_label,
-                    check_jupiter, history_ready
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                row['id'], row['token_address'], row['token_pair'], row['name'], 
-                row['symbol'], row['icon'], row['decimals'], row['dev'],
-                row['circ_supply'], row['total_supply'], row['token_program'], 
-                row['holder_count'], row['usd_price'], row['liquidity'], 
-                row['fdv'], row['mcap'], row['price_block_id'], 
-                row['organic_score'], row['organic_score_label'],
-                row['check_jupiter'], row['history_ready']
-            ))
-        
-        # Комітимо зміни
-        self.new_conn.commit()
+            FROM old.token_ids ti
+            LEFT JOIN old.tokens t ON t.token_id = ti.id
+        """)
         
         migrated_count = self.new_conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
         self.log(f"✅ Migrated {migrated_count} tokens")
         
-        # 2. Аудит дані
+        # 2. Аудит дані: один UPDATE ... FROM прямо зі старої БД
         self.log("\n📊 Migrating audit data...")
-        audit_data = self.old_conn.execute("""
-            SELECT token_id, mint_authority_disabled, freeze_authority_disabled, top_holders_percentage
-            FROM token_audit
-        """).fetchall()
-        
-        for row in audit_data:
-            self.new_conn.execute("""
-                UPDATE tokens
-                SET 
-                    mint_authority_disabled = ?,
-                    freeze_authority_disabled = ?,
-                    top_holders_percentage = ?,
-                    dev_balance_percentage = NULL
-                WHERE id = ?
-            """, (row['mint_authority_disabled'], row['freeze_authority_disabled'], 
-                  row['top_holders_percentage'], row['token_id']))
+        self.new_conn.execute("""
+            UPDATE tokens
+            SET 
+                mint_authority_disabled = a.mint_authority_disabled,
+                freeze_authority_disabled = a.freeze_authority_disabled,
+                top_holders_percentage = a.top_holders_percentage,
+                dev_balance_percentage = NULL
+            FROM (
+                SELECT token_id, mint_authority_disabled, freeze_authority_disabled, top_holders_percentage
+                FROM old.token_audit
+            ) a
+            WHERE tokens.id = a.token_id
+        """)
         
-        self.new_conn.commit()
         self.log("✅ Migrated audit data")
         
-        # 3. Статистика
-        for period in ['5m', '1h', '6h', '24h']:
-            self.log(f"\n📊 Migrating {period} stats...")
-            table = f"token_stats_{period}"
-            period_suffix = period.replace('m', '')  # 5m -> 5, 1h -> 1h
-            
-            stats_data = self.old_conn.execute(f"""
-                SELECT token_id, price_change, liquidity_change, buy_volume, sell_volume, 
-                       buy_organic_volume, num_buys, num_sells, num_traders
-                FROM {table}
-            """).fetchall()
-            
-            for row in stats_data:
-                self.new_conn.execute(f"""
-                    UPDATE tokens
-                    SET 
-                        price_change_{period_suffix} = ?,
-                        holder_change_{period_suffix} = NULL,
-                        liquidity_change_{period_suffix} = ?,
-                        buy_volume_{period_suffix} = ?,
-                        sell_volume_{period_suffix} = ?,
-                        buy_organic_volume_{period_suffix} = ?,
-                        sell_organic_volume_{period_suffix} = NULL,
-                        volume_change_{period_suffix} = NULL,
-                        num_buys_{period_suffix} = ?,
-                        num_sells_{period_suffix} = ?,
-                        num_traders_{period_suffix} = ?
-                    WHERE id = ?
-                """, (row['price_change'], row['liquidity_change'], row['buy_volume'], 
-                      row['sell_volume'], row['buy_organic_volume'], row['num_buys'], 
-                      row['num_sells'], row['num_traders'], row['token_id']))
-            
-            self.new_conn.commit()
-            self.log(f"✅ Migrated {period} stats")
+        # 3. Статистика: один UPDATE на всі 4 періоди (кожна stats-таблиця читається один раз,
+        # кожен рядок tokens пишеться один раз)
+        self.log("\n📊 Migrating 5m/1h/6h/24h stats...")
+        periods = ['5m', '1h', '6h', '24h']
+        stats_columns = [
+            'price_change', 'liquidity_change', 'buy_volume', 'sell_volume',
+            'buy_organic_volume', 'num_buys', 'num_sells', 'num_traders'
+        ]
+        null_columns = ['holder_change', 'sell_organic_volume', 'volume_change']
+        
+        set_clauses = []
+        for period in periods:
+            set_clauses += [f"{col}_{period} = s_{period}.{col}" for col in stats_columns]
+            set_clauses += [f"{col}_{period} = NULL" for col in null_columns]
+        joins = "\n".join(
+            f"LEFT JOIN old.token_stats_{period} s_{period} ON s_{period}.token_id = ti.id"
+            for period in periods
+        )
+        
+        self.new_conn.execute(f"""
+            UPDATE tokens
+            SET {', '.join(set_clauses)}
+            FROM old.token_ids ti
+            {joins}
+            WHERE tokens.id = ti.id
+        """)
+        
+        self.log("✅ Migrated 5m/1h/6h/24h stats")
     
     def migrate_trades(self):
         """Міграція торгових операцій"""
         self.log(f"\n{'='*80}\n💱 Migrating trades...")
         
-        trades_data = self.old_conn.execute("""
+        self.new_conn.execute("""
+            INSERT INTO trades (
+                token_id, signature, timestamp, readable_time, direction, 
+                amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
+            )
             SELECT token_id, signature, timestamp, readable_time, direction, 
                    amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
-            FROM trades
-        """).fetchall()
-        
-        for row in trades_data:
-            self.new_conn.execute("""
-                INSERT INTO trades (
-                    token_id, signature, timestamp, readable_time, direction, 
-                    amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (row['token_id'], row['signature'], row['timestamp'], row['readable_time'], 
-                  row['direction'], row['amount_tokens'], row['amount_sol'], 
-                  row['amount_usd'], row['token_price_usd'], row['created_at']))
+            FROM old.trades
+        """)
         
-        self.new_conn.commit()
         trades_count = self.new_conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
         self.log(f"✅ Migrated {trades_count} trades")
     
@@ -327,22 +324,20 @@ class DBMigrator:
         # 3. Перевіряємо випадковий токен
         token_id = self.old_conn.execute("SELECT id FROM token_ids LIMIT 1").fetchone()[0]
         
-        old_token = dict(self.old_conn.execute("""
-            SELECT ti.*, t.* 
-            FROM token_ids ti 
-            LEFT JOIN tokens t ON t.token_id = ti.id 
-            WHERE ti.id = ?
-        """, (token_id,)).fetchone())
+        # Порівнюється лише token_address — вибираємо тільки його, за позицією
+        old_address = self.old_conn.execute(
+            "SELECT token_address FROM token_ids WHERE id = ?", (token_id,)
+        ).fetchone()[0]
         
-        new_token = dict(self.new_conn.execute("""
-            SELECT * FROM tokens WHERE id = ?
-        """, (token_id,)).fetchone())
+        new_address = self.new_conn.execute(
+            "SELECT token_address FROM tokens WHERE id = ?", (token_id,)
+        ).fetchone()[0]
         
         self.log(f"\nRandom token (id={token_id}):")
-        self.log(f"  Old DB: {old_token['token_address']}")
-        self.log(f"  New DB: {new_token['token_address']}")
+        self.log(f"  Old DB: {old_address}")
+        self.log(f"  New DB: {new_address}")
         
-        if old_token['token_address'] != new_token['token_address']:
+        if old_address != new_address:
             self.log("❌ Random token check failed!")
             return False
         
@@ -361,13 +356,18 @@ class DBMigrator:
             # 3. Створюємо нову схему
             self.create_new_schema()
             
-            # 4. Мігруємо дані
+            # 4. Мігруємо дані — усі записи в одній транзакції
+            self.new_conn.execute("BEGIN")
             self.migrate_tokens()
             self.migrate_trades()
             
-            # 5. Валідація
+            # 5. Індекси — вже по заповнених таблицях
+            self.create_indexes()
+            
+            # 6. Валідація
             if not self.validate_migration():
                 raise Exception("Migration validation failed!")
+            self.new_conn.commit()
             
             self.log(f"\n{'='*80}")
             self.log("🎉 Migration completed successfully!")
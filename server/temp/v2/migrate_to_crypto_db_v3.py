@@ -7,58 +7,130 @@
 import asyncio
 import sqlite3
 import asyncpg
+import uvloop
 from db_config import POSTGRES_CONFIG
 from datetime import datetime
+from decimal import Decimal
+
+TOKEN_COLUMNS = [
+    'id', 'token_address', 'token_pair', 'name', 'symbol', 'icon', 'decimals', 'dev',
+    'circ_supply', 'total_supply', 'token_program', 'holder_count',
+    'usd_price', 'liquidity', 'fdv', 'mcap', 'price_block_id',
+    'organic_score', 'organic_score_label',
+    'mint_authority_disabled', 'freeze_authority_disabled',
+    'top_holders_percentage', 'dev_balance_percentage',
+    'check_jupiter', 'history_ready', 'created_at'
+]
+
+# PostgreSQL-типи колонок TOKEN_COLUMNS для INSERT ... SELECT FROM unnest(...)
+TOKEN_COLUMN_TYPES = [
+    'int', 'text', 'text', 'text', 'text', 'text', 'int', 'text',
+    'numeric', 'numeric', 'text', 'int',
+    'numeric', 'numeric', 'numeric', 'numeric', 'bigint',
+    'numeric', 'text',
+    'bool', 'bool',
+    'numeric', 'numeric',
+    'int', 'bool', 'timestamp'
+]
+
+UNNEST_BATCH_SIZE = 10_000
+
+TRADE_COLUMNS = [
+    'id', 'token_id', 'signature', 'timestamp', 'readable_time', 'direction',
+    'amount_tokens', 'amount_sol', 'amount_usd', 'token_price_usd', 'created_at'
+]
+
+def parse_created_at(value):
+    """SQLite ISO-рядок → datetime (або None)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+async def init_codecs(conn):
+    """BOOLEAN кодується драйвером з будь-якого truthy-значення SQLite (0/1) — без bool() на кожен рядок"""
+    await conn.set_type_codec(
+        'bool', encoder=lambda v: b'\x01' if v else b'\x00', decoder=lambda b: b != b'\x00',
+        schema='pg_catalog', format='binary'
+    )
 
 class SQLiteToPostgreSQLMigratorV3:
-    def __init__(self):
+    def __init__(self, use_copy: bool = True):
         self.sqlite_path = "db/tokens.db"
+        # False — токени через INSERT ... unnest (напр. якщо на tokens є тригери, несумісні з COPY)
+        self.use_copy = use_copy
         self.postgres_config = POSTGRES_CONFIG.copy()
         self.postgres_config['database'] = 'crypto_db'
         self.postgres_config.pop('min_size', None)
         self.postgres_config.pop('max_size', None)
     
+    def connect_sqlite(self):
+        """Окреме read-only підключення до SQLite (по одному на кожну паралельну задачу)"""
+        sqlite_conn = sqlite3.connect(self.sqlite_path)
+        # Джерело лише читається: заборона запису, 4 GB mmap замість pread();
+        # locking_mode=EXCLUSIVE не ставимо — два читачі одного файлу заблокували б один одного
+        sqlite_conn.execute("PRAGMA query_only=1")
+        sqlite_conn.execute("PRAGMA mmap_size=4294967296")
+        # 256 MB page cache і тимчасові структури (автоіндекс LEFT JOIN) у пам'яті, а не у temp-файлі;
+        # journal_mode/synchronous не чіпаємо — вони впливають лише на запис, а WAL змінив би сам файл джерела
+        sqlite_conn.execute("PRAGMA cache_size=-262144")
+        sqlite_conn.execute("PRAGMA temp_store=MEMORY")
+        return sqlite_conn
+    
+    async def connect_postgres(self):
+        """Окреме з'єднання PostgreSQL з кодеками міграції"""
+        postgres_conn = await asyncpg.connect(**self.postgres_config)
+        await init_codecs(postgres_conn)
+        return postgres_conn
+    
     async def migrate(self):
         """Основна функція міграції"""
         print("🚀 Початок міграції з SQLite в PostgreSQL (V3 структура)...")
         
-        # Підключаємося до SQLite
-        sqlite_conn = sqlite3.connect(self.sqlite_path)
-        sqlite_conn.row_factory = sqlite3.Row
-        
-        # Підключаємося до PostgreSQL
-        postgres_conn = await asyncpg.connect(**self.postgres_config)
+        # Підключаємося до SQLite і PostgreSQL: по парі з'єднань на токени і на trades
+        tokens_sqlite = self.connect_sqlite()
+        trades_sqlite = self.connect_sqlite()
+        tokens_conn = await self.connect_postgres()
+        trades_conn = await self.connect_postgres()
         
         try:
-            # 1. Створюємо таблиці з правильною структурою
-            await self.create_tables(postgres_conn)
+            # 1. Створюємо таблиці з правильною структурою (без індексів)
+            await self.create_tables(tokens_conn)
+            
+            # 2-3. Мігруємо токени і trades паралельно, кожні у своїй транзакції
+            # (FK між таблицями немає, тож порядок завантаження неважливий)
+            await asyncio.gather(
+                self.migrate_tokens(tokens_sqlite, tokens_conn),
+                self.migrate_trades(trades_sqlite, trades_conn)
+            )
             
-            # 2. Мігруємо токени
-            await self.migrate_tokens(sqlite_conn, postgres_conn)
+            # 4. Індекси — вже по заповнених таблицях
+            await self.create_indexes(tokens_conn)
             
-            # 3. Мігруємо trades
-            await self.migrate_trades(sqlite_conn, postgres_conn)
+            # 5. Валідація
+            await self.validate_migration(tokens_sqlite, tokens_conn)
             
-            # 4. Валідація
-            await self.validate_migration(sqlite_conn, postgres_conn)
+            # 6. Дані на місці — вмикаємо WAL для таблиць
+            await tokens_conn.execute('ALTER TABLE tokens SET LOGGED')
+            await tokens_conn.execute('ALTER TABLE trades SET LOGGED')
             
             print("✅ Міграція завершена успішно!")
             
         finally:
-            sqlite_conn.close()
-            await postgres_conn.close()
+            tokens_sqlite.close()
+            trades_sqlite.close()
+            await tokens_conn.close()
+            await trades_conn.close()
     
     async def create_tables(self, postgres_conn):
         """Створюємо таблиці згідно з V3 структурою"""
         print("🏗️ Створюємо таблиці...")
         
-        # Видаляємо існуючі таблиці
-        await postgres_conn.execute('DROP TABLE IF EXISTS trades CASCADE')
-        await postgres_conn.execute('DROP TABLE IF EXISTS tokens CASCADE')
-        
-        # Створюємо таблицю tokens з повною структурою
+        # Весь DDL одним multi-statement рядком: один round-trip (Simple Query) замість окремого на кожну команду
         await postgres_conn.execute('''
-            CREATE TABLE tokens (
+            -- Видаляємо існуючі таблиці
+            DROP TABLE IF EXISTS trades CASCADE;
+            DROP TABLE IF EXISTS tokens CASCADE;
+            
+            -- Таблиця tokens з повною структурою (UNLOGGED на час завантаження — без WAL)
+            CREATE UNLOGGED TABLE tokens (
                 id SERIAL PRIMARY KEY,
                 token_address VARCHAR(44) UNIQUE NOT NULL,
                 token_pair VARCHAR(44),
@@ -83,51 +155,52 @@ class SQLiteToPostgreSQLMigratorV3:
                 freeze_authority_disabled BOOLEAN,
                 top_holders_percentage DECIMAL(5,2),
                 dev_balance_percentage DECIMAL(5,2),
+                -- Stats: аналітичні метрики, не облік — DOUBLE PRECISION (нативний float-кодек asyncpg замість Decimal)
                 -- Stats 5m
-                price_change_5m DECIMAL(10,4),
-                holder_change_5m DECIMAL(10,4),
-                liquidity_change_5m DECIMAL(10,4),
-                volume_change_5m DECIMAL(10,4),
-                buy_volume_5m DECIMAL(20,8),
-                sell_volume_5m DECIMAL(20,8),
-                buy_organic_volume_5m DECIMAL(20,8),
-                sell_organic_volume_5m DECIMAL(20,8),
+                price_change_5m DOUBLE PRECISION,
+                holder_change_5m DOUBLE PRECISION,
+                liquidity_change_5m DOUBLE PRECISION,
+                volume_change_5m DOUBLE PRECISION,
+                buy_volume_5m DOUBLE PRECISION,
+                sell_volume_5m DOUBLE PRECISION,
+                buy_organic_volume_5m DOUBLE PRECISION,
+                sell_organic_volume_5m DOUBLE PRECISION,
                 num_buys_5m INTEGER,
                 num_sells_5m INTEGER,
                 num_traders_5m INTEGER,
                 -- Stats 1h
-                price_change_1h DECIMAL(10,4),
-                holder_change_1h DECIMAL(10,4),
-                liquidity_change_1h DECIMAL(10,4),
-                volume_change_1h DECIMAL(10,4),
-                buy_volume_1h DECIMAL(20,8),
-                sell_volume_1h DECIMAL(20,8),
-                buy_organic_volume_1h DECIMAL(20,8),
-                sell_organic_volume_1h DECIMAL(20,8),
+                price_change_1h DOUBLE PRECISION,
+                holder_change_1h DOUBLE PRECISION,
+                liquidity_change_1h DOUBLE PRECISION,
+                volume_change_1h DOUBLE PRECISION,
+                buy_volume_1h DOUBLE PRECISION,
+                sell_volume_1h DOUBLE PRECISION,
+                buy_organic_volume_1h DOUBLE PRECISION,
+                sell_organic_volume_1h DOUBLE PRECISION,
                 num_buys_1h INTEGER,
                 num_sells_1h INTEGER,
                 num_traders_1h INTEGER,
                 -- Stats 6h
-                price_change_6h DECIMAL(10,4),
-                holder_change_6h DECIMAL(10,4),
-                liquidity_change_6h DECIMAL(10,4),
-                volume_change_6h DECIMAL(10,4),
-                buy_volume_6h DECIMAL(20,8),
-                sell_volume_6h DECIMAL(20,8),
-                buy_organic_volume_6h DECIMAL(20,8),
-                sell_organic_volume_6h DECIMAL(20,8),
+                price_change_6h DOUBLE PRECISION,
+                holder_change_6h DOUBLE PRECISION,
+                liquidity_change_6h DOUBLE PRECISION,
+                volume_change_6h DOUBLE PRECISION,
+                buy_volume_6h DOUBLE PRECISION,
+                sell_volume_6h DOUBLE PRECISION,
+                buy_organic_volume_6h DOUBLE PRECISION,
+                sell_organic_volume_6h DOUBLE PRECISION,
                 num_buys_6h INTEGER,
                 num_sells_6h INTEGER,
                 num_traders_6h INTEGER,
                 -- Stats 24h
-                price_change_24h DECIMAL(10,4),
-                holder_change_24h DECIMAL(10,4),
-                liquidity_change_24h DECIMAL(10,4),
-                volume_change_24h DECIMAL(10,4),
-                buy_volume_24h DECIMAL(20,8),
-                sell_volume_24h DECIMAL(20,8),
-                buy_organic_volume_24h DECIMAL(20,8),
-                sell_organic_volume_24h DECIMAL(20,8),
+                price_change_24h DOUBLE PRECISION,
+                holder_change_24h DOUBLE PRECISION,
+                liquidity_change_24h DOUBLE PRECISION,
+                volume_change_24h DOUBLE PRECISION,
+                buy_volume_24h DOUBLE PRECISION,
+                sell_volume_24h DOUBLE PRECISION,
+                buy_organic_volume_24h DOUBLE PRECISION,
+                sell_organic_volume_24h DOUBLE PRECISION,
                 num_buys_24h INTEGER,
                 num_sells_24h INTEGER,
                 num_traders_24h INTEGER,
@@ -135,12 +208,10 @@ class SQLiteToPostgreSQLMigratorV3:
                 check_jupiter INTEGER DEFAULT 0,
                 history_ready BOOLEAN DEFAULT FALSE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Створюємо таблицю trades
-        await postgres_conn.execute('''
-            CREATE TABLE trades (
+            );
+            
+            -- Таблиця trades
+            CREATE UNLOGGED TABLE trades (
                 id SERIAL PRIMARY KEY,
                 token_id INTEGER NOT NULL,
                 signature VARCHAR(88) UNIQUE NOT NULL,
@@ -152,114 +223,145 @@ class SQLiteToPostgreSQLMigratorV3:
                 amount_usd TEXT NOT NULL,
                 token_price_usd TEXT DEFAULT '0.0000000000',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            );
         ''')
         
-        # Створюємо індекси
-        await postgres_conn.execute('CREATE INDEX idx_tokens_address ON tokens(token_address)')
-        await postgres_conn.execute('CREATE INDEX idx_tokens_pair ON tokens(token_pair)')
-        await postgres_conn.execute('CREATE INDEX idx_tokens_check_jupiter ON tokens(check_jupiter)')
-        await postgres_conn.execute('CREATE INDEX idx_tokens_history_ready ON tokens(history_ready)')
-        await postgres_conn.execute('CREATE INDEX idx_tokens_price ON tokens(usd_price)')
-        await postgres_conn.execute('CREATE INDEX idx_tokens_liquidity ON tokens(liquidity)')
-        await postgres_conn.execute('CREATE INDEX idx_tokens_organic_score ON tokens(organic_score)')
+        print("✅ Таблиці створено згідно з V3 структурою")
+    
+    async def create_indexes(self, postgres_conn):
+        """Створюємо індекси після завантаження: один bulk-build замість оновлення B-tree на кожен рядок"""
+        print("🗂️ Створюємо індекси...")
         
-        await postgres_conn.execute('CREATE INDEX idx_trades_token_id ON trades(token_id)')
-        await postgres_conn.execute('CREATE INDEX idx_trades_signature ON trades(signature)')
-        await postgres_conn.execute('CREATE INDEX idx_trades_timestamp ON trades(timestamp)')
-        await postgres_conn.execute('CREATE INDEX idx_trades_direction ON trades(direction)')
+        # Один multi-statement execute замість окремого round-trip на кожен індекс;
+        # більше пам'яті і паралельні воркери для сортування при побудові індексів
+        await postgres_conn.execute('''
+            SET maintenance_work_mem = '1GB';
+            SET max_parallel_maintenance_workers = 4;
+            
+            CREATE INDEX idx_tokens_address ON tokens(token_address);
+            CREATE INDEX idx_tokens_pair ON tokens(token_pair);
+            CREATE INDEX idx_tokens_check_jupiter ON tokens(check_jupiter);
+            CREATE INDEX idx_tokens_history_ready ON tokens(history_ready);
+            CREATE INDEX idx_tokens_price ON tokens(usd_price);
+            CREATE INDEX idx_tokens_liquidity ON tokens(liquidity);
+            CREATE INDEX idx_tokens_organic_score ON tokens(organic_score);
+            
+            CREATE INDEX idx_trades_token_id ON trades(token_id);
+            CREATE INDEX idx_trades_signature ON trades(signature);
+            CREATE INDEX idx_trades_timestamp ON trades(timestamp);
+            CREATE INDEX idx_trades_direction ON trades(direction);
+        ''')
         
-        print("✅ Таблиці створено згідно з V3 структурою")
+        print("✅ Індекси створено")
     
     async def migrate_tokens(self, sqlite_conn, postgres_conn):
         """Мігруємо токени з token_ids та tokens таблиць"""
         print("📦 Мігруємо токени...")
         
-        # Отримуємо дані з SQLite
+        # Кількість окремим COUNT — рядки далі йдуть потоком, без fetchall у пам'ять
+        total = sqlite_conn.execute("SELECT COUNT(*) FROM token_ids").fetchone()[0]
+        print(f"📊 Знайдено {total} токенів для міграції")
+        
+        # Отримуємо дані з SQLite звичайними кортежами; порядок SELECT = TOKEN_COLUMNS
         cursor = sqlite_conn.execute("""
             SELECT 
-                ti.id, ti.token_address, ti.token_pair, ti.check_jupiter, ti.history_ready,
+                ti.id, ti.token_address, ti.token_pair,
                 t.name, t.symbol, t.icon, t.decimals, t.dev, t.circ_supply, t.total_supply,
                 t.token_program, t.holder_count, t.usd_price, t.liquidity, t.fdv, t.mcap,
                 t.price_block_id, t.organic_score, t.organic_score_label,
                 NULL as mint_authority_disabled, NULL as freeze_authority_disabled,
-                NULL as top_holders_percentage, NULL as dev_balance_percentage, ti.created_at
+                NULL as top_holders_percentage, NULL as dev_balance_percentage,
+                ti.check_jupiter, ti.history_ready, ti.created_at
             FROM token_ids ti
             LEFT JOIN tokens t ON ti.id = t.token_id
         """)
         
-        rows = cursor.fetchall()
-        print(f"📊 Знайдено {len(rows)} токенів для міграції")
+        # Binary COPY одним потоком; created_at — datetime для бінарного формату
+        records = ((*row[:25], parse_created_at(row[25])) for row in cursor)
         
-        # Вставляємо в PostgreSQL
-        for row in rows:
-            await postgres_conn.execute("""
-                INSERT INTO tokens (
-                    id, token_address, token_pair, name, symbol, icon, decimals, dev,
-                    circ_supply, total_supply, token_program, holder_count,
-                    usd_price, liquidity, fdv, mcap, price_block_id,
-                    organic_score, organic_score_label,
-                    mint_authority_disabled, freeze_authority_disabled,
-                    top_holders_percentage, dev_balance_percentage,
-                    check_jupiter, history_ready, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12,
-                    $13, $14, $15, $16, $17, $18, $19, $20, $21, $22, $23, $24, $25, $26, $27
-                )
-            """, 
-                row['id'], row['token_address'], row['token_pair'], 
-                row['name'], row['symbol'], row['icon'], row['decimals'], row['dev'],
-                row['circ_supply'], row['total_supply'], row['token_program'], row['holder_count'],
-                row['usd_price'], row['liquidity'], row['fdv'], row['mcap'], row['price_block_id'],
-                row['organic_score'], row['organic_score_label'],
-                row['mint_authority_disabled'], row['freeze_authority_disabled'],
-                row['top_holders_percentage'], row['dev_balance_percentage'],
-                row['check_jupiter'], bool(row['history_ready']), row['created_at']
-            )
+        async with postgres_conn.transaction():
+            if self.use_copy:
+                await postgres_conn.copy_records_to_table('tokens', records=records, columns=TOKEN_COLUMNS)
+            else:
+                await self.insert_tokens_unnest(postgres_conn, records)
+            # id вставлені явно — зсуваємо SERIAL-послідовність за MAX(id)
+            await postgres_conn.execute("SELECT setval('tokens_id_seq', COALESCE(MAX(id), 1)) FROM tokens")
+            migrated = await postgres_conn.fetchval("SELECT COUNT(*) FROM tokens")
+        
+        print(f"✅ Мігровано {migrated} токенів")
+    
+    async def insert_tokens_unnest(self, postgres_conn, records):
+        """
+        Fallback без COPY: пачки по UNNEST_BATCH_SIZE рядків, кожна — один INSERT ... SELECT FROM unnest,
+        де кожна колонка передається одним масивом-параметром (один round-trip на пачку)
+        """
+        arrays = ', '.join(f'${i + 1}::{t}[]' for i, t in enumerate(TOKEN_COLUMN_TYPES))
+        # Prepared один раз: пачки лише Bind/Execute, без повторного Parse і пошуку в кеші
+        stmt = await postgres_conn.prepare(
+            f"INSERT INTO tokens ({', '.join(TOKEN_COLUMNS)}) SELECT * FROM unnest({arrays})"
+        )
         
-        print(f"✅ Мігровано {len(rows)} токенів")
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == UNNEST_BATCH_SIZE:
+                await stmt.fetch(*map(list, zip(*batch)))
+                batch = []
+        if batch:
+            await stmt.fetch(*map(list, zip(*batch)))
     
     async def migrate_trades(self, sqlite_conn, postgres_conn):
         """Мігруємо trades"""
         print("📈 Мігруємо trades...")
         
-        # Отримуємо дані з SQLite
-        cursor = sqlite_conn.execute("SELECT * FROM trades")
-        rows = cursor.fetchall()
-        print(f"📊 Знайдено {len(rows)} trades для міграції")
+        total = sqlite_conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+        print(f"📊 Знайдено {total} trades для міграції")
         
-        # Вставляємо в PostgreSQL
-        for row in rows:
-            await postgres_conn.execute("""
-                INSERT INTO trades (
-                    id, token_id, signature, timestamp, readable_time, direction,
-                    amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
-                ) VALUES (
-                    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11
-                )
-            """, 
-                row['id'], row['token_id'], row['signature'], row['timestamp'], 
-                row['readable_time'], row['direction'], row['amount_tokens'], 
-                row['amount_sol'], row['amount_usd'], row['token_price_usd'], row['created_at']
-            )
+        # Отримуємо дані з SQLite; порядок SELECT = TRADE_COLUMNS
+        cursor = sqlite_conn.execute("""
+            SELECT id, token_id, signature, timestamp, readable_time, direction,
+                   amount_tokens, amount_sol, amount_usd, token_price_usd, created_at
+            FROM trades
+        """)
+        
+        # Binary COPY одним потоком прямо з курсора; amount_tokens — DECIMAL, тож Decimal
+        records = (
+            (*row[:6], Decimal(str(row[6])), *row[7:10], parse_created_at(row[10]))
+            for row in cursor
+        )
+        
+        async with postgres_conn.transaction():
+            await postgres_conn.copy_records_to_table('trades', records=records, columns=TRADE_COLUMNS)
+            await postgres_conn.execute("SELECT setval('trades_id_seq', COALESCE(MAX(id), 1)) FROM trades")
+            migrated = await postgres_conn.fetchval("SELECT COUNT(*) FROM trades")
         
-        print(f"✅ Мігровано {len(rows)} trades")
+        print(f"✅ Мігровано {migrated} trades")
     
-    async def validate_migration(self, sqlite_conn, postgres_conn):
-        """Валідація міграції"""
+    async def validate_migration(self, sqlite_conn, postgres_conn, exact: bool = True):
+        """
+        Валідація міграції: обидва COUNT-и кожної бази одним запитом.
+        exact=False бере оцінку reltuples з pg_class замість повного скану в PostgreSQL.
+        """
         print("🔍 Валідація міграції...")
         
-        # Перевіряємо кількість токенів
-        sqlite_count = sqlite_conn.execute("SELECT COUNT(*) FROM token_ids").fetchone()[0]
-        postgres_count = await postgres_conn.fetchval("SELECT COUNT(*) FROM tokens")
+        sqlite_count, sqlite_trades = sqlite_conn.execute(
+            "SELECT (SELECT COUNT(*) FROM token_ids), (SELECT COUNT(*) FROM trades)"
+        ).fetchone()
+        
+        if exact:
+            row = await postgres_conn.fetchrow(
+                "SELECT (SELECT COUNT(*) FROM tokens) AS tokens, (SELECT COUNT(*) FROM trades) AS trades"
+            )
+        else:
+            row = await postgres_conn.fetchrow("""
+                SELECT
+                    (SELECT reltuples::bigint FROM pg_class WHERE relname = 'tokens') AS tokens,
+                    (SELECT reltuples::bigint FROM pg_class WHERE relname = 'trades') AS trades
+            """)
+        postgres_count, postgres_trades = row['tokens'], row['trades']
         
         print(f"📊 SQLite токенів: {sqlite_count}")
         print(f"📊 PostgreSQL токенів: {postgres_count}")
-        
-        # Перевіряємо кількість trades
-        sqlite_trades = sqlite_conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
-        postgres_trades = await postgres_conn.fetchval("SELECT COUNT(*) FROM trades")
-        
         print(f"📈 SQLite trades: {sqlite_trades}")
         print(f"📈 PostgreSQL trades: {postgres_trades}")
         
@@ -273,4 +375,6 @@ async def main():
     await migrator.migrate()
 
 if __name__ == "__main__":
+    # libuv-цикл замість стандартного selector-циклу
+    uvloop.install()
     asyncio.run(main())
@@ -0,0 +1,18 @@
+-- Індекси token_ids під запити TokensReaderV2
+-- Виконати: psql -U yevhenvasylenko -d crypto_app -f token_ids_indexes.sql
+-- (CONCURRENTLY не можна виконувати всередині транзакції)
+
+-- Список токенів: ORDER BY created_at DESC, id DESC + keyset (created_at, id) < (...)
+-- Без INCLUDE: рядки token_ids постійно оновлюються (ціна/mcap), тож index-only scan
+-- все одно ходив би в heap, а покриваючий індекс дублював би всю таблицю
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_token_ids_created_desc
+    ON token_ids (created_at DESC, id DESC);
+
+-- Пошук токенів: name ILIKE '%q%' OR symbol ILIKE '%q%' (BitmapOr двох trigram-індексів)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_token_ids_name_trgm
+    ON token_ids USING GIN (name gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_token_ids_symbol_trgm
+    ON token_ids USING GIN (symbol gin_trgm_ops);
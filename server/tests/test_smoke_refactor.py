@@ -10,16 +10,28 @@ Smoke-тести для перевірки рефакторингу (видал
 """
 
 import asyncio
+import functools
+import inspect
+import re
 import pytest
 from _v3_db_pool import get_db_pool
 from _v2_buy_sell import sell_real, finalize_token_sale
 from _v2_buy_sell import buy_real as force_buy_real
 from _v3_analyzer_jupiter import get_analyzer
 
+# Заборонені sim_* посилання в коді (регекси компілюються один раз на модуль)
+SIM_FIELD_RE = re.compile(r'sim_', re.IGNORECASE)
+SIM_BUY_ITERATION_RE = re.compile(r'sim_buy_iteration')
+
+
+@functools.lru_cache(maxsize=None)
+def _src(fn) -> str:
+    """inspect.getsource з кешем: файл читається і розбирається один раз на функцію."""
+    return inspect.getsource(fn)
+
 
 async def test_no_simulation_functions():
     """Перевірка, що simulation-функції видалені."""
-    import inspect
     from _v2_buy_sell import sell_real
     
     # Перевірка, що sell_simulation не існує
@@ -27,8 +39,8 @@ async def test_no_simulation_functions():
         "sell_simulation повинна бути видалена"
     
     # Перевірка, що finalize_token_sale не використовує sim_*
-    source = inspect.getsource(finalize_token_sale)
-    assert 'sim_' not in source.lower(), \
+    source = _src(finalize_token_sale)
+    assert not SIM_FIELD_RE.search(source), \
         "finalize_token_sale не повинна використовувати sim_* поля"
 
 
@@ -118,9 +130,8 @@ async def test_analyzer_uses_wallet_history():
     """Перевірка, що аналізатор використовує wallet_history для перевірки відкритих позицій."""
     analyzer = await get_analyzer()
     # Перевірка, що аналізатор не використовує sim_* поля
-    import inspect
-    source = inspect.getsource(analyzer.save_token_data)
-    assert 'sim_buy_iteration' not in source, \
+    source = _src(analyzer.save_token_data)
+    assert not SIM_BUY_ITERATION_RE.search(source), \
         "Аналізатор не повинен використовувати sim_buy_iteration"
     assert 'wallet_history' in source or 'exit_iteration' in source, \
         "Аналізатор повинен використовувати wallet_history для перевірки позицій"
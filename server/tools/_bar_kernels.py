@@ -0,0 +1,83 @@
+"""
+Numba kernels for SOL minute bars (used by tools/analyze_pair.py).
+
+Inputs are float64/int64 arrays already sorted by minute (then by ts inside a minute);
+one pass over them emits o/h/l/c/vwap/volumes per minute without per-group temporaries.
+cache=True keeps the compiled kernel in __pycache__, so only the first run pays for JIT.
+numba is optional: without it compute_bars is the numpy reduceat version with the same output.
+No fastmath: price = sol/tok is inf for tiny token amounts, and fastmath lets LLVM assume no inf/NaN.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba not installed -> _compute_bars_np
+    njit = None
+
+
+def _compute_bars_np(minute, price, tok, sol, weight):
+    # contiguous minute groups -> one reduceat per aggregate
+    starts = np.flatnonzero(np.r_[True, minute[1:] != minute[:-1]])
+    ends = np.r_[starts[1:], len(minute)]
+    vtok = np.add.reduceat(tok, starts)
+    vsol = np.add.reduceat(sol, starts)
+    # VWAP by configured weight (tok/sol are > 0, so den > 0)
+    vwap = np.add.reduceat(price * weight, starts) / np.add.reduceat(weight, starts)
+    return (minute[starts], price[starts],
+            np.maximum.reduceat(price, starts), np.minimum.reduceat(price, starts),
+            price[ends - 1], vwap, vtok, vsol, ends - starts)
+
+
+def _compute_bars_loops(minute, price, tok, sol, weight):
+    n = minute.shape[0]
+    t_out = np.empty(n, dtype=np.int64)
+    o_out = np.empty(n, dtype=np.float64)
+    h_out = np.empty(n, dtype=np.float64)
+    l_out = np.empty(n, dtype=np.float64)
+    c_out = np.empty(n, dtype=np.float64)
+    vwap_out = np.empty(n, dtype=np.float64)
+    vtok_out = np.empty(n, dtype=np.float64)
+    vsol_out = np.empty(n, dtype=np.float64)
+    cnt_out = np.empty(n, dtype=np.int64)
+
+    g = -1
+    num = 0.0
+    den = 0.0
+    for i in range(n):
+        p = price[i]
+        if g < 0 or minute[i] != t_out[g]:
+            # flush previous minute, open a new one
+            if g >= 0:
+                vwap_out[g] = num / den if den > 0 else c_out[g]
+            g += 1
+            t_out[g] = minute[i]
+            o_out[g] = p
+            h_out[g] = p
+            l_out[g] = p
+            vtok_out[g] = 0.0
+            vsol_out[g] = 0.0
+            cnt_out[g] = 0
+            num = 0.0
+            den = 0.0
+        else:
+            if p > h_out[g]:
+                h_out[g] = p
+            if p < l_out[g]:
+                l_out[g] = p
+        c_out[g] = p
+        num += p * weight[i]
+        den += weight[i]
+        vtok_out[g] += tok[i]
+        vsol_out[g] += sol[i]
+        cnt_out[g] += 1
+    if g >= 0:
+        vwap_out[g] = num / den if den > 0 else c_out[g]
+
+    m = g + 1
+    return (t_out[:m], o_out[:m], h_out[:m], l_out[:m], c_out[:m],
+            vwap_out[:m], vtok_out[:m], vsol_out[:m], cnt_out[:m])
+
+
+# compiled lazily on the first call (or loaded from the __pycache__ cache)
+compute_bars = njit(cache=True)(_compute_bars_loops) if njit is not None else _compute_bars_np
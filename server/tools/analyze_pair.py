@@ -12,117 +12,276 @@ Goals:
 - Print simple diagnostics to understand shape mismatches.
 
 Does not modify DB or server behavior. Pure read-only analysis.
+
+Every query filters trades by token_id + timestamp range; a composite index
+`CREATE INDEX ON trades (token_id, timestamp)` serves them (and the ORDER BY) directly.
 """
 
 import asyncio
 import argparse
-import json
 import time
-from decimal import Decimal
-from typing import Dict, List
+from typing import Dict, List, Tuple
+
+import numpy as np
+import orjson
 
 import sys
 sys.path.append('server')
 
 from _v3_db_pool import get_db_pool
+from _bar_kernels import compute_bars
+
+
+TRADES_SQL = (
+    'SELECT timestamp, direction, amount_tokens, amount_sol, token_price_usd, signature\n'
+    'FROM trades WHERE token_id=$1 AND timestamp BETWEEN $2 AND $3 ORDER BY timestamp ASC'
+)
+# rows per server-side cursor round-trip (asyncpg default is 50)
+CURSOR_PREFETCH = 10_000
+
+# SQL path (no drop-pct/IQR filters): aggregation runs in Postgres, trades are never shipped.
+# One row per trade in the window; amount_sol/token_price_usd are TEXT in trades.
+TRADE_ROWS_SQL = """
+    SELECT timestamp AS ts, direction, signature, (timestamp / 60) * 60 AS m,
+           amount_tokens::float8 AS tok, NULLIF(amount_sol, '')::float8 AS sol,
+           NULLIF(token_price_usd, '')::float8 AS usd
+    FROM trades
+    WHERE token_id = $1 AND timestamp BETWEEN $2 AND $3
+"""
+# per-minute o/h/l/c/vwap/volumes; o/c follow the (ts, price, tok, sol) order of the Python path
+BAR_AGGS_SQL = """
+    m AS t,
+    (array_agg(price ORDER BY ts, price, tok, sol))[1] AS o,
+    MAX(price) AS h, MIN(price) AS l,
+    (array_agg(price ORDER BY ts DESC, price DESC, tok DESC, sol DESC))[1] AS c,
+    SUM(price * {w}) / SUM({w}) AS vwap,
+    SUM(tok) AS volume_tokens, SUM(sol) AS volume_sol, COUNT(*) AS trades_count
+"""
+# both bar variants in one round-trip: inc_withdraw = all trades, the other one honours $4 (include_withdraw)
+BARS_SQL = f"""
+    WITH p AS (
+        SELECT *, sol / tok AS price FROM ({TRADE_ROWS_SQL}) r WHERE tok > 0 AND sol > 0
+    )
+    SELECT TRUE AS inc_withdraw, {BAR_AGGS_SQL} FROM p GROUP BY m
+    UNION ALL
+    SELECT FALSE, {BAR_AGGS_SQL} FROM p WHERE $4 OR direction IS DISTINCT FROM 'withdraw' GROUP BY m
+    ORDER BY 1, 2
+"""
+USD_SECOND_SQL = f"""
+    SELECT AVG(usd) AS avg_usd FROM ({TRADE_ROWS_SQL}) r
+    WHERE usd > 0 GROUP BY ts ORDER BY ts
+"""
+COUNTS_SQL = """
+    SELECT COUNT(*) AS n, COUNT(*) FILTER (WHERE direction = 'withdraw') AS n_withdraw
+    FROM trades WHERE token_id = $1 AND timestamp BETWEEN $2 AND $3
+"""
+# 5 lowest / 5 highest price_sol trades (price 0.0 where amounts are missing/non-positive)
+EXTREMES_SQL = f"""
+    WITH p AS (
+        SELECT *, CASE WHEN tok > 0 AND sol > 0 THEN sol / tok ELSE 0.0 END AS price
+        FROM ({TRADE_ROWS_SQL}) r
+    )
+    (SELECT 'low' AS kind, ts, direction, price, COALESCE(tok, 0.0) AS tok, COALESCE(sol, 0.0) AS sol, signature
+     FROM p ORDER BY price, ts LIMIT 5)
+    UNION ALL
+    (SELECT 'high', ts, direction, price, COALESCE(tok, 0.0), COALESCE(sol, 0.0), signature
+     FROM p ORDER BY price DESC, ts DESC LIMIT 5)
+"""
+
+
+def _amounts(amount_tokens, amount_sol) -> Tuple[float, float]:
+    # (amount_tokens, amount_sol) as native floats; unparsable -> (0, 0), dropped by the > 0 checks
+    try:
+        return float(amount_tokens), float(amount_sol)
+    except (TypeError, ValueError):
+        return 0.0, 0.0
+
+
+def _group_second_avg_usd(ts: np.ndarray, usd: np.ndarray) -> List[float]:
+    # per-second sums and counts via bincount (sorted by second)
+    mask = usd > 0
+    _, inv = np.unique(ts[mask], return_inverse=True)
+    sums = np.bincount(inv, weights=usd[mask])
+    counts = np.bincount(inv)
+    return np.round(sums / counts, 10).tolist()
 
 
-def _percentile(values: List[float], pct: float) -> float:
-    if not values:
-        return 0.0
-    vs = sorted(values)
-    if pct <= 0:
-        return vs[0]
-    if pct >= 100:
-        return vs[-1]
-    k = (len(vs) - 1) * (pct / 100.0)
-    f = int(k)
-    c = min(f + 1, len(vs) - 1)
-    if f == c:
-        return vs[int(k)]
-    return vs[f] * (c - k) + vs[c] * (k - f)
-
-
-def _group_second_avg_usd(trades: List[Dict]) -> List[float]:
-    by_sec: Dict[int, List[float]] = {}
-    for tr in trades:
-        ts = int(tr['timestamp'])
-        usd = float(tr.get('token_price_usd') or 0.0)
-        if usd > 0:
-            by_sec.setdefault(ts, []).append(usd)
-    series = []
-    prev = None
-    for sec in sorted(by_sec.keys()):
-        prices = by_sec[sec]
-        if prices:
-            avg = sum(prices) / len(prices)
-            val = round(avg, 10)
-            series.append(val)
-            prev = val
-        elif prev is not None:
-            series.append(prev)
-    return series
+def _group_percentile(groups: np.ndarray, values: np.ndarray, *pcts: float) -> List[np.ndarray]:
+    """Per-row percentiles of `values` within its group, same interpolation as np.percentile's default 'linear' method.
+
+    `groups` must already be sorted; one sort serves all `pcts`, each result is aligned with the input rows.
+    """
+    v = values[np.lexsort((values, groups))]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(groups)])
+    out = []
+    for pct in pcts:
+        pct = min(max(float(pct), 0.0), 100.0)
+        k = (sizes - 1) * (pct / 100.0)
+        f = k.astype(np.int64)
+        c = np.minimum(f + 1, sizes - 1)
+        lo, hi = v[starts + f], v[starts + c]
+        q = np.where(f == c, lo, lo * (c - k) + hi * (k - f))
+        out.append(np.repeat(q, sizes))
+    return out
+
+
+def _trade_arrays(ts: List[int], amounts: List[Tuple[float, float]], usd: List[float],
+                  direction: List[str], signature: List[str]) -> Dict[str, np.ndarray]:
+    # column lists -> parallel arrays (trade order) shared by every bar variant and diagnostic
+    n = len(ts)
+    amounts = np.array(amounts, dtype=np.float64).reshape(n, 2)
+    tok, sol = amounts[:, 0], amounts[:, 1]
+    valid = (tok > 0) & (sol > 0)
+    # price_sol per trade, 0.0 where amounts are missing/non-positive
+    price = np.divide(sol, tok, out=np.zeros(n), where=valid)
+    return {
+        'ts': np.array(ts, dtype=np.int64),
+        'tok': tok, 'sol': sol, 'price': price, 'valid': valid,
+        'usd': np.array(usd, dtype=np.float64),
+        'withdraw': np.fromiter((d == 'withdraw' for d in direction), dtype=bool, count=n),
+        'direction': np.array(direction, dtype=object),
+        'signature': np.array(signature, dtype=object),
+    }
+
+
+async def _fetch_trade_arrays(conn, stmt, token_id: int, start: int, end: int) -> Dict[str, np.ndarray]:
+    # stream the window through a server-side cursor straight into column lists (no Record list, no dict per row);
+    # `stmt` is TRADES_SQL prepared once per connection, so repeated calls (several pairs) skip parse/plan
+    ts, amounts, usd, direction, signature = [], [], [], [], []
+    async with conn.transaction():
+        # positional unpack in TRADES_SQL column order instead of a by-name lookup per field
+        async for r in stmt.cursor(token_id, start, end, prefetch=CURSOR_PREFETCH):
+            r_ts, r_direction, r_tok, r_sol, r_usd, r_signature = r
+            ts.append(r_ts)
+            amounts.append(_amounts(r_tok, r_sol))
+            usd.append(float(r_usd or 0.0))
+            direction.append(r_direction)
+            signature.append(r_signature)
+    return _trade_arrays(ts, amounts, usd, direction, signature)
 
 
 def _minute_bars_sol(
-    trades: List[Dict],
-    drop_withdraw: bool = True,
+    arrays: Dict[str, np.ndarray],
+    keep_mask: np.ndarray = None,
     drop_pct: float = 0.0,
     iqr_k: float = None,
     weight_by: str = "tokens",
 ) -> List[Dict]:
-    by_min: Dict[int, List] = {}
-    for tr in trades:
-        if drop_withdraw and tr.get('direction') == 'withdraw':
-            continue
-        ts = int(tr['timestamp'])
-        m = (ts // 60) * 60
-        try:
-            tok = Decimal(str(tr['amount_tokens']))
-        except Exception:
-            tok = Decimal(0)
-        sol = Decimal(str(tr['amount_sol']))
-        if tok <= 0 or sol <= 0:
-            continue
-        p = sol / tok
-        by_min.setdefault(m, []).append((ts, p, tok, sol))
-    out: List[Dict] = []
-    for m in sorted(by_min.keys()):
-        arr = sorted(by_min[m])
-        # volume percentile filter (by tokens or sol)
-        if drop_pct and drop_pct > 0 and arr:
-            vols = [float(a[2] if weight_by == "tokens" else a[3]) for a in arr]
-            cut = _percentile(vols, float(drop_pct))
-            arr = [a for a in arr if (float(a[2]) if weight_by == "tokens" else float(a[3])) >= cut]
-        # IQR filter on price in a minute
-        if iqr_k is not None and arr:
-            prices = [float(a[1]) for a in arr]
-            q1 = _percentile(prices, 25)
-            q3 = _percentile(prices, 75)
-            iqr = q3 - q1
-            lo = q1 - float(iqr_k) * iqr
-            hi = q3 + float(iqr_k) * iqr
-            arr = [a for a in arr if lo <= float(a[1]) <= hi]
-        o = arr[0][1]; c = arr[-1][1]
-        h = max(x[1] for x in arr); l = min(x[1] for x in arr)
-        vtok = sum(x[2] for x in arr)
-        vsol = sum(x[3] for x in arr)
-        # VWAP by configured weight
-        if weight_by == "sol":
-            den = vsol
-            num = sum(x[1]*x[3] for x in arr)
-        else:
-            den = vtok
-            num = sum(x[1]*x[2] for x in arr)
-        vwap = (num/den) if den > 0 else c
-        out.append({
-            't': m,
-            'o': float(o), 'h': float(h), 'l': float(l), 'c': float(c),
-            'vwap': float(vwap),
-            'volume_tokens': float(vtok), 'volume_sol': float(vsol),
-            'trades_count': len(arr)
-        })
-    return out
+    mask = arrays['valid'] if keep_mask is None else arrays['valid'] & keep_mask
+    ts, tok, sol, price = arrays['ts'][mask], arrays['tok'][mask], arrays['sol'][mask], arrays['price'][mask]
+    # sort by minute, then (ts, price, tok, sol) inside a minute: first row = open, last row = close
+    order = np.lexsort((sol, tok, price, ts))
+    ts, tok, sol, price = ts[order], tok[order], sol[order], price[order]
+    minute = (ts // 60) * 60
+
+    # volume percentile filter (by tokens or sol), per minute
+    if drop_pct and drop_pct > 0 and len(ts):
+        vols = tok if weight_by == "tokens" else sol
+        cut, = _group_percentile(minute, vols, drop_pct)
+        keep = vols >= cut
+        minute, tok, sol, price = minute[keep], tok[keep], sol[keep], price[keep]
+    # IQR filter on price in a minute
+    if iqr_k is not None and len(minute):
+        # q1 and q3 from one per-minute sort
+        q1, q3 = _group_percentile(minute, price, 25, 75)
+        iqr = q3 - q1
+        keep = (q1 - float(iqr_k) * iqr <= price) & (price <= q3 + float(iqr_k) * iqr)
+        minute, tok, sol, price = minute[keep], tok[keep], sol[keep], price[keep]
+    if not len(minute):
+        return []
+
+    # one fused JIT pass over the sorted arrays -> o/h/l/c/vwap/volumes per minute
+    bars = compute_bars(minute, price, tok, sol, sol if weight_by == "sol" else tok)
+    return [
+        {
+            't': t,
+            'o': o, 'h': h, 'l': l, 'c': c,
+            'vwap': vw,
+            'volume_tokens': vt, 'volume_sol': vs,
+            'trades_count': cnt
+        }
+        for t, o, h, l, c, vw, vt, vs, cnt in zip(*(a.tolist() for a in bars))
+    ]
+
+
+def _extreme(ts, direction, price, tok, sol, signature) -> Dict:
+    return {
+        'timestamp': int(ts),
+        'direction': direction,
+        'price_sol': round(float(price), 12),
+        'amount_tokens': float(tok),
+        'amount_sol': float(sol),
+        'signature': signature,
+    }
+
+
+def _extreme_idx(price: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    # k lowest / k highest positions in O(N) via argpartition; ties at the cut are widened and
+    # re-sorted stably, so the order matches sorted(...)[:k] / sorted(...)[-k:] exactly
+    n = len(price)
+    if n <= k:
+        order = np.argsort(price, kind='stable')
+        return order, order
+    lo = np.flatnonzero(price <= price[np.argpartition(price, k - 1)[:k]].max())
+    hi = np.flatnonzero(price >= price[np.argpartition(price, n - k)[n - k:]].min())
+    return lo[np.argsort(price[lo], kind='stable')][:k], hi[np.argsort(price[hi], kind='stable')][-k:]
+
+
+def _python_shapes(arrays: Dict[str, np.ndarray], args) -> Dict:
+    # Build both shapes (trades parsed once; the SOL variants differ only by the row mask)
+    usd_second_series = _group_second_avg_usd(arrays['ts'], arrays['usd'])
+    sol_minute_bars_inc_withdraw = _minute_bars_sol(
+        arrays,
+        drop_pct=args.drop_pct,
+        iqr_k=args.iqr_k,
+        weight_by=args.weight_by,
+    )
+    sol_minute_bars = _minute_bars_sol(
+        arrays,
+        keep_mask=None if args.include_withdraw else ~arrays['withdraw'],
+        drop_pct=args.drop_pct,
+        iqr_k=args.iqr_k,
+        weight_by=args.weight_by,
+    )
+
+    # Quick diagnostics
+    n = len(arrays['ts'])
+    # Extreme price_sol movers: price already computed per trade; top-5 each way by argpartition
+    worst_idx, top_idx = _extreme_idx(arrays['price'])
+    cols = ('ts', 'direction', 'price', 'tok', 'sol', 'signature')
+    return {
+        'usd_second': usd_second_series,
+        'sol_bars_withdraw_included': sol_minute_bars_inc_withdraw,
+        'sol_bars': sol_minute_bars,
+        'trades_total': n,
+        'withdraw_records': int(arrays['withdraw'].sum()),
+        'lowest': [_extreme(*(arrays[c][i] for c in cols)) for i in worst_idx],
+        'highest': [_extreme(*(arrays[c][i] for c in cols)) for i in top_idx],
+    }
+
+
+async def _sql_shapes(conn, token_id: int, start: int, end: int, args) -> Dict:
+    # same shapes as _python_shapes, aggregated by Postgres (no per-trade rows over the wire)
+    w = 'sol' if args.weight_by == 'sol' else 'tok'
+    bars: Dict[bool, List[Dict]] = {True: [], False: []}
+    for r in await conn.fetch(BARS_SQL.format(w=w), token_id, start, end, bool(args.include_withdraw)):
+        bar = dict(r)
+        bars[bar.pop('inc_withdraw')].append(bar)
+    usd = await conn.fetch(USD_SECOND_SQL, token_id, start, end)
+    counts = await conn.fetchrow(COUNTS_SQL, token_id, start, end)
+    extremes = await conn.fetch(EXTREMES_SQL, token_id, start, end)
+    cols = ('ts', 'direction', 'price', 'tok', 'sol', 'signature')
+    return {
+        'usd_second': np.round(np.array([r['avg_usd'] for r in usd], dtype=np.float64), 10).tolist(),
+        'sol_bars_withdraw_included': bars[True],
+        'sol_bars': bars[False],
+        'trades_total': counts['n'],
+        'withdraw_records': counts['n_withdraw'],
+        'lowest': [_extreme(*(r[c] for c in cols)) for r in extremes if r['kind'] == 'low'],
+        # ascending like the Python path
+        'highest': [_extreme(*(r[c] for c in cols)) for r in extremes if r['kind'] == 'high'][::-1],
+    }
 
 
 async def main():
@@ -143,46 +302,15 @@ async def main():
     async with pool.acquire() as conn:
         tok = await conn.fetchrow('SELECT id, token_address, name, symbol FROM tokens WHERE token_pair = $1', args.pair)
         if not tok:
-            print(json.dumps({'success': False, 'error': 'pair not found'}, ensure_ascii=False))
+            print(orjson.dumps({'success': False, 'error': 'pair not found'}).decode())
             return
         token_id = int(tok['id'])
-        rows = await conn.fetch(
-            'SELECT timestamp, direction, amount_tokens, amount_sol, token_price_usd, signature\n'
-            'FROM trades WHERE token_id=$1 AND timestamp BETWEEN $2 AND $3 ORDER BY timestamp ASC',
-            token_id, start, end
-        )
-        trades = [dict(r) for r in rows]
-
-    # Build both shapes
-    usd_second_series = _group_second_avg_usd(trades)
-    sol_minute_bars_inc_withdraw = _minute_bars_sol(
-        trades,
-        drop_withdraw=not args.include_withdraw and False,
-        drop_pct=args.drop_pct,
-        iqr_k=args.iqr_k,
-        weight_by=args.weight_by,
-    )
-    sol_minute_bars = _minute_bars_sol(
-        trades,
-        drop_withdraw=not args.include_withdraw,
-        drop_pct=args.drop_pct,
-        iqr_k=args.iqr_k,
-        weight_by=args.weight_by,
-    )
-
-    # Quick diagnostics
-    n = len(trades)
-    n_withdraw = sum(1 for t in trades if t.get('direction') == 'withdraw')
-    # Extreme price_sol movers
-    def psol(t):
-        try:
-            tok = Decimal(str(t['amount_tokens']))
-            sol = Decimal(str(t['amount_sol']))
-            return float(sol / tok) if tok > 0 and sol > 0 else 0.0
-        except Exception:
-            return 0.0
-    worst = sorted(trades, key=psol)[:5]
-    top = sorted(trades, key=psol)[-5:]
+        if args.drop_pct or args.iqr_k is not None:
+            # per-minute percentile filters need the trades: stream them into arrays
+            stmt = await conn.prepare(TRADES_SQL)
+            shapes = _python_shapes(await _fetch_trade_arrays(conn, stmt, token_id, start, end), args)
+        else:
+            shapes = await _sql_shapes(conn, token_id, start, end, args)
 
     result = {
         'success': True,
@@ -194,43 +322,26 @@ async def main():
         },
         'window': {'start': start, 'end': end, 'hours': args.hours},
         'counts': {
-            'trades_total': n,
-            'withdraw_records': n_withdraw,
-            'usd_second_points': len(usd_second_series),
-            'sol_minute_bars_withdraw_included': len(sol_minute_bars_inc_withdraw),
-            'sol_minute_bars': len(sol_minute_bars),
+            'trades_total': shapes['trades_total'],
+            'withdraw_records': shapes['withdraw_records'],
+            'usd_second_points': len(shapes['usd_second']),
+            'sol_minute_bars_withdraw_included': len(shapes['sol_bars_withdraw_included']),
+            'sol_minute_bars': len(shapes['sol_bars']),
         },
-        'sol_bars': sol_minute_bars,
-        'sol_bars_withdraw_included': sol_minute_bars_inc_withdraw,
-        'usd_second': usd_second_series[-120:],  # last 2 minutes worth of seconds if dense
+        'sol_bars': shapes['sol_bars'],
+        'sol_bars_withdraw_included': shapes['sol_bars_withdraw_included'],
+        'usd_second': shapes['usd_second'][-120:],  # last 2 minutes worth of seconds if dense
         'extremes': {
-            'lowest_price_sol_trades': [
-                {
-                    'timestamp': int(t['timestamp']),
-                    'direction': t['direction'],
-                    'price_sol': round(psol(t), 12),
-                    'amount_tokens': float(t['amount_tokens']),
-                    'amount_sol': float(t['amount_sol']),
-                    'signature': t['signature'],
-                } for t in worst
-            ],
-            'highest_price_sol_trades': [
-                {
-                    'timestamp': int(t['timestamp']),
-                    'direction': t['direction'],
-                    'price_sol': round(psol(t), 12),
-                    'amount_tokens': float(t['amount_tokens']),
-                    'amount_sol': float(t['amount_sol']),
-                    'signature': t['signature'],
-                } for t in top
-            ],
+            'lowest_price_sol_trades': shapes['lowest'],
+            'highest_price_sol_trades': shapes['highest'],
         },
     }
 
+    # orjson: float-heavy bar arrays serialize natively (UTF-8 output, like ensure_ascii=False)
     if args.json:
-        print(json.dumps(result, ensure_ascii=False))
+        print(orjson.dumps(result).decode())
     else:
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
 
 
 if __name__ == '__main__':
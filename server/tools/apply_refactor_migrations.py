@@ -11,6 +11,7 @@
 """
 
 import asyncio
+import re
 import sys
 import os
 from pathlib import Path
@@ -29,6 +30,9 @@ MIGRATION_FILES = [
     "20250117_add_has_real_trading.sql",  # Add has_real_trading column for SWAP/TRANSFER check
 ]
 
+# Власні BEGIN;/COMMIT; файлів міграцій (окремими рядками; BEGIN у DO-блоках без ';' не чіпаємо)
+FILE_TX_STATEMENT_RE = re.compile(r"^\s*(BEGIN|COMMIT)\s*;\s*$", re.IGNORECASE | re.MULTILINE)
+
 
 async def check_migration_needed(conn) -> dict:
     """Перевірити, чи потрібні міграції."""
@@ -41,40 +45,36 @@ async def check_migration_needed(conn) -> dict:
         "new_fields_exist": [],
     }
     
-    # Перевірка таблиць
-    tables = await conn.fetch("""
-        SELECT table_name 
-        FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-          AND table_name IN ('sim_wallet_history', 'wallet_history', 'sim_wallets', 'wallets')
-    """)
-    for row in tables:
-        name = row["table_name"]
-        if name == "sim_wallet_history":
-            status["sim_wallet_history_exists"] = True
-        elif name == "wallet_history":
-            status["wallet_history_exists"] = True
-        elif name == "sim_wallets":
-            status["sim_wallets_exists"] = True
-        elif name == "wallets":
-            status["wallets_exists"] = True
-    
-    # Перевірка полів tokens
-    sim_fields = await conn.fetch("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'tokens' 
-          AND column_name LIKE 'sim_%'
+    # Таблиці і обидва набори полів tokens — одним запитом прямо по pg_class/pg_attribute
+    # (індексовані каталоги замість повільних information_schema view), один round-trip
+    rows = await conn.fetch("""
+        WITH tokens_cols AS (
+            SELECT attname::text AS name, attnum
+            FROM pg_attribute
+            WHERE attrelid = to_regclass('public.tokens')
+              AND attnum > 0
+              AND NOT attisdropped
+        )
+        SELECT 'table' AS kind, relname::text AS name, 0 AS attnum
+        FROM pg_class
+        WHERE relnamespace = 'public'::regnamespace
+          AND relkind IN ('r', 'p', 'v', 'f')
+          AND relname IN ('sim_wallet_history', 'wallet_history', 'sim_wallets', 'wallets')
+        UNION ALL
+        SELECT 'sim_field', name, attnum FROM tokens_cols WHERE name LIKE 'sim_%'
+        UNION ALL
+        SELECT 'new_field', name, attnum FROM tokens_cols
+        WHERE name IN ('plan_sell_iteration', 'plan_sell_price_usd', 'wallet_id', 'cur_income_price_usd')
+        ORDER BY kind, attnum
     """)
-    status["sim_fields_exist"] = [r["column_name"] for r in sim_fields]
-    
-    new_fields = await conn.fetch("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'tokens' 
-          AND column_name IN ('plan_sell_iteration', 'plan_sell_price_usd', 'wallet_id', 'cur_income_price_usd')
-    """)
-    status["new_fields_exist"] = [r["column_name"] for r in new_fields]
+    for row in rows:
+        if row["kind"] == "table":
+            # sim_wallet_history / wallet_history / sim_wallets / wallets → <name>_exists
+            status[f"{row['name']}_exists"] = True
+        elif row["kind"] == "sim_field":
+            status["sim_fields_exist"].append(row["name"])
+        else:
+            status["new_fields_exist"].append(row["name"])
     
     return status
 
@@ -82,8 +82,8 @@ async def check_migration_needed(conn) -> dict:
 async def apply_migration_file(conn, filepath: Path, dry_run: bool = False) -> bool:
     """Застосувати один файл міграції."""
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            sql = f.read().strip()
+        # Читання файлу в потоці — не блокує event loop (aiofiles не тягнемо: stdlib достатньо)
+        sql = (await asyncio.to_thread(filepath.read_text, encoding="utf-8")).strip()
         
         if not sql:
             print(f"⚠️  {filepath.name}: файл порожній, пропускаємо")
@@ -91,17 +91,20 @@ async def apply_migration_file(conn, filepath: Path, dry_run: bool = False) -> b
         
         if dry_run:
             print(f"🔍 [DRY-RUN] {filepath.name}: перевірка синтаксису...")
-            # Перевірка синтаксису (спроба виконати в транзакції з rollback)
-            async with conn.transaction():
-                try:
-                    await conn.execute("BEGIN")
-                    await conn.execute(sql)
-                    await conn.execute("ROLLBACK")
-                    print(f"✅ [DRY-RUN] {filepath.name}: синтаксис правильний")
-                    return True
-                except Exception as e:
-                    print(f"❌ [DRY-RUN] {filepath.name}: помилка синтаксису: {e}")
-                    return False
+            # Перевірка синтаксису: виконуємо в транзакції, яка завжди відкочується
+            # (без вкладених BEGIN/ROLLBACK, що конфліктували з transaction()).
+            # COMMIT; з самого файлу закомітив би цю транзакцію — тому BEGIN;/COMMIT; файлу прибираємо
+            tr = conn.transaction()
+            await tr.start()
+            try:
+                await conn.execute(FILE_TX_STATEMENT_RE.sub("", sql))
+                print(f"✅ [DRY-RUN] {filepath.name}: синтаксис правильний")
+                return True
+            except Exception as e:
+                print(f"❌ [DRY-RUN] {filepath.name}: помилка синтаксису: {e}")
+                return False
+            finally:
+                await tr.rollback()
         else:
             print(f"📝 Застосовуємо {filepath.name}...")
             await conn.execute(sql)
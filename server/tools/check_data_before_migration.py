@@ -13,14 +13,15 @@ from _v3_db_pool import get_db_pool
 async def check_data():
     """Перевірити дані перед міграцією."""
     pool = await get_db_pool()
-    async with pool.acquire() as conn:
-        print("=" * 60)
-        print("🔍 Перевірка даних перед міграцією")
-        print("=" * 60)
-        
-        # 1. Перевірка sim_* полів в tokens
-        print("\n📊 1. Дані в tokens.sim_* полях:")
-        sim_data = await conn.fetchrow("""
+    print("=" * 60)
+    print("🔍 Перевірка даних перед міграцією")
+    print("=" * 60)
+    
+    # Усі перевірки незалежні — виконуємо паралельно на окремих з'єднаннях пулу;
+    # COUNT і агрегати кожної таблиці — одним запитом. Відсутня таблиця → виняток у результаті
+    sim_data, sim_wallets_data, sim_history_data, wallet_history_count, wallets_count = await asyncio.gather(
+        # 1. sim_* поля в tokens
+        pool.fetchrow("""
             SELECT 
                 COUNT(*) FILTER (WHERE sim_buy_iteration IS NOT NULL) AS tokens_with_sim_buy,
                 COUNT(*) FILTER (WHERE sim_sell_iteration IS NOT NULL) AS tokens_with_sim_sell,
@@ -28,113 +29,122 @@ async def check_data():
                 COUNT(*) FILTER (WHERE sim_buy_iteration IS NOT NULL AND sim_sell_iteration IS NULL) AS open_sim_positions,
                 COUNT(*) FILTER (WHERE sim_buy_iteration IS NOT NULL AND sim_sell_iteration IS NOT NULL) AS closed_sim_positions
             FROM tokens
-        """)
-        
-        if sim_data:
-            print(f"  - Токени з sim_buy_iteration: {sim_data['tokens_with_sim_buy']}")
-            print(f"  - Токени з sim_sell_iteration: {sim_data['tokens_with_sim_sell']}")
-            print(f"  - Токени з sim_wallet_id: {sim_data['tokens_with_sim_wallet']}")
-            print(f"  - Відкриті sim позиції: {sim_data['open_sim_positions']}")
-            print(f"  - Закриті sim позиції: {sim_data['closed_sim_positions']}")
-            
-            if sim_data['open_sim_positions'] > 0 or sim_data['closed_sim_positions'] > 0:
-                print(f"\n  ⚠️  УВАГА: Знайдено {sim_data['open_sim_positions'] + sim_data['closed_sim_positions']} позицій у sim_* полях!")
-                print(f"     Ці дані будуть ВТРАЧЕНІ, якщо не мігрувати їх у wallet_history!")
-        
-        # 2. Перевірка sim_wallets
-        print("\n📊 2. Дані в таблиці sim_wallets:")
-        try:
-            sim_wallets_count = await conn.fetchval("SELECT COUNT(*) FROM sim_wallets")
-            print(f"  - Записів у sim_wallets: {sim_wallets_count}")
-            
-            if sim_wallets_count > 0:
-                sim_wallets_data = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) FILTER (WHERE active_token_id IS NOT NULL) AS wallets_in_trade,
-                        SUM(cash_usd) AS total_cash,
-                        SUM(total_profit_usd) AS total_profit
-                    FROM sim_wallets
-                """)
-                print(f"  - Кошельків в торгівлі: {sim_wallets_data['wallets_in_trade']}")
-                print(f"  - Загальний cash_usd: {sim_wallets_data['total_cash']}")
-                print(f"  - Загальний profit: {sim_wallets_data['total_profit']}")
-                print(f"\n  ⚠️  УВАГА: Дані в sim_wallets будуть ВТРАЧЕНІ!")
-                print(f"     Рекомендується мігрувати їх у таблицю wallets!")
-        except Exception as e:
-            print(f"  - Таблиця sim_wallets не існує або помилка: {e}")
-        
-        # 3. Перевірка sim_wallet_history
-        print("\n📊 3. Дані в таблиці sim_wallet_history:")
-        try:
-            sim_history_count = await conn.fetchval("SELECT COUNT(*) FROM sim_wallet_history")
-            print(f"  - Записів у sim_wallet_history: {sim_history_count}")
-            
-            if sim_history_count > 0:
-                sim_history_data = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) FILTER (WHERE exit_iteration IS NULL) AS open_positions,
-                        COUNT(*) FILTER (WHERE exit_iteration IS NOT NULL) AS closed_positions,
-                        SUM(entry_amount_usd) AS total_entry_amount,
-                        SUM(exit_amount_usd) AS total_exit_amount
-                    FROM sim_wallet_history
-                """)
-                print(f"  - Відкритих позицій: {sim_history_data['open_positions']}")
-                print(f"  - Закритих позицій: {sim_history_data['closed_positions']}")
-                print(f"  - Загальна сума входів: {sim_history_data['total_entry_amount']}")
-                print(f"  - Загальна сума виходів: {sim_history_data['total_exit_amount']}")
-                print(f"\n  ℹ️  Ці дані будуть збережені (таблиця перейменовується в wallet_history)")
-        except Exception as e:
-            print(f"  - Таблиця sim_wallet_history не існує або помилка: {e}")
-        
-        # 4. Перевірка wallet_history (чи вже існує)
-        print("\n📊 4. Дані в таблиці wallet_history:")
-        try:
-            wallet_history_count = await conn.fetchval("SELECT COUNT(*) FROM wallet_history")
-            print(f"  - Записів у wallet_history: {wallet_history_count}")
-        except Exception as e:
-            print(f"  - Таблиця wallet_history не існує: {e}")
-        
-        # 5. Перевірка wallets (чи вже існує)
-        print("\n📊 5. Дані в таблиці wallets:")
-        try:
-            wallets_count = await conn.fetchval("SELECT COUNT(*) FROM wallets")
-            print(f"  - Записів у wallets: {wallets_count}")
-        except Exception as e:
-            print(f"  - Таблиця wallets не існує: {e}")
-        
-        # 6. Підсумок
-        print("\n" + "=" * 60)
-        print("📋 ПІДСУМОК:")
-        print("=" * 60)
-        
-        data_at_risk = False
-        warnings = []
-        
-        if sim_data and (sim_data['open_sim_positions'] > 0 or sim_data['closed_sim_positions'] > 0):
-            data_at_risk = True
-            warnings.append(f"⚠️  {sim_data['open_sim_positions'] + sim_data['closed_sim_positions']} позицій у tokens.sim_* будуть втрачені")
+        """),
+        # 2. sim_wallets
+        pool.fetchrow("""
+            SELECT 
+                COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE active_token_id IS NOT NULL) AS wallets_in_trade,
+                SUM(cash_usd) AS total_cash,
+                SUM(total_profit_usd) AS total_profit
+            FROM sim_wallets
+        """),
+        # 3. sim_wallet_history
+        pool.fetchrow("""
+            SELECT 
+                COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE exit_iteration IS NULL) AS open_positions,
+                COUNT(*) FILTER (WHERE exit_iteration IS NOT NULL) AS closed_positions,
+                SUM(entry_amount_usd) AS total_entry_amount,
+                SUM(exit_amount_usd) AS total_exit_amount
+            FROM sim_wallet_history
+        """),
+        # 4-5. wallet_history / wallets (чи вже існують)
+        pool.fetchval("SELECT COUNT(*) FROM wallet_history"),
+        pool.fetchval("SELECT COUNT(*) FROM wallets"),
+        return_exceptions=True,
+    )
+    # sim_* поля в tokens перевірялись без try — помилку тут, як і раніше, не ковтаємо
+    if isinstance(sim_data, Exception):
+        raise sim_data
+    
+    # 1. Перевірка sim_* полів в tokens
+    print("\n📊 1. Дані в tokens.sim_* полях:")
+    if sim_data:
+        print(f"  - Токени з sim_buy_iteration: {sim_data['tokens_with_sim_buy']}")
+        print(f"  - Токени з sim_sell_iteration: {sim_data['tokens_with_sim_sell']}")
+        print(f"  - Токени з sim_wallet_id: {sim_data['tokens_with_sim_wallet']}")
+        print(f"  - Відкриті sim позиції: {sim_data['open_sim_positions']}")
+        print(f"  - Закриті sim позиції: {sim_data['closed_sim_positions']}")
         
-        try:
-            if sim_wallets_count and sim_wallets_count > 0:
-                data_at_risk = True
-                warnings.append(f"⚠️  {sim_wallets_count} записів у sim_wallets будуть втрачені")
-        except:
-            pass
+        if sim_data['open_sim_positions'] > 0 or sim_data['closed_sim_positions'] > 0:
+            print(f"\n  ⚠️  УВАГА: Знайдено {sim_data['open_sim_positions'] + sim_data['closed_sim_positions']} позицій у sim_* полях!")
+            print(f"     Ці дані будуть ВТРАЧЕНІ, якщо не мігрувати їх у wallet_history!")
+    
+    # 2. Перевірка sim_wallets
+    print("\n📊 2. Дані в таблиці sim_wallets:")
+    sim_wallets_count = None
+    if isinstance(sim_wallets_data, Exception):
+        print(f"  - Таблиця sim_wallets не існує або помилка: {sim_wallets_data}")
+    else:
+        sim_wallets_count = sim_wallets_data['total']
+        print(f"  - Записів у sim_wallets: {sim_wallets_count}")
         
-        if data_at_risk:
-            print("\n❌ Є дані, які можуть бути втрачені!")
-            for warning in warnings:
-                print(f"  {warning}")
-            print("\n💡 РЕКОМЕНДАЦІЇ:")
-            print("  1. Створіть бекап БД перед міграцією")
-            print("  2. Розкоментуйте відповідні блоки в 20251106_data_migration.sql")
-            print("  3. Застосуйте data migration ПЕРЕД schema migration")
-            print("  4. Перевірте результат після міграції")
-        else:
-            print("\n✅ Дані безпечні - немає даних, які будуть втрачені")
-            print("   Можна безпечно застосувати міграції")
+        if sim_wallets_count > 0:
+            print(f"  - Кошельків в торгівлі: {sim_wallets_data['wallets_in_trade']}")
+            print(f"  - Загальний cash_usd: {sim_wallets_data['total_cash']}")
+            print(f"  - Загальний profit: {sim_wallets_data['total_profit']}")
+            print(f"\n  ⚠️  УВАГА: Дані в sim_wallets будуть ВТРАЧЕНІ!")
+            print(f"     Рекомендується мігрувати їх у таблицю wallets!")
+    
+    # 3. Перевірка sim_wallet_history
+    print("\n📊 3. Дані в таблиці sim_wallet_history:")
+    if isinstance(sim_history_data, Exception):
+        print(f"  - Таблиця sim_wallet_history не існує або помилка: {sim_history_data}")
+    else:
+        print(f"  - Записів у sim_wallet_history: {sim_history_data['total']}")
         
-        print("\n" + "=" * 60)
+        if sim_history_data['total'] > 0:
+            print(f"  - Відкритих позицій: {sim_history_data['open_positions']}")
+            print(f"  - Закритих позицій: {sim_history_data['closed_positions']}")
+            print(f"  - Загальна сума входів: {sim_history_data['total_entry_amount']}")
+            print(f"  - Загальна сума виходів: {sim_history_data['total_exit_amount']}")
+            print(f"\n  ℹ️  Ці дані будуть збережені (таблиця перейменовується в wallet_history)")
+    
+    # 4. Перевірка wallet_history (чи вже існує)
+    print("\n📊 4. Дані в таблиці wallet_history:")
+    if isinstance(wallet_history_count, Exception):
+        print(f"  - Таблиця wallet_history не існує: {wallet_history_count}")
+    else:
+        print(f"  - Записів у wallet_history: {wallet_history_count}")
+    
+    # 5. Перевірка wallets (чи вже існує)
+    print("\n📊 5. Дані в таблиці wallets:")
+    if isinstance(wallets_count, Exception):
+        print(f"  - Таблиця wallets не існує: {wallets_count}")
+    else:
+        print(f"  - Записів у wallets: {wallets_count}")
+    
+    # 6. Підсумок
+    print("\n" + "=" * 60)
+    print("📋 ПІДСУМОК:")
+    print("=" * 60)
+    
+    data_at_risk = False
+    warnings = []
+    
+    if sim_data and (sim_data['open_sim_positions'] > 0 or sim_data['closed_sim_positions'] > 0):
+        data_at_risk = True
+        warnings.append(f"⚠️  {sim_data['open_sim_positions'] + sim_data['closed_sim_positions']} позицій у tokens.sim_* будуть втрачені")
+    
+    if sim_wallets_count and sim_wallets_count > 0:
+        data_at_risk = True
+        warnings.append(f"⚠️  {sim_wallets_count} записів у sim_wallets будуть втрачені")
+    
+    if data_at_risk:
+        print("\n❌ Є дані, які можуть бути втрачені!")
+        for warning in warnings:
+            print(f"  {warning}")
+        print("\n💡 РЕКОМЕНДАЦІЇ:")
+        print("  1. Створіть бекап БД перед міграцією")
+        print("  2. Розкоментуйте відповідні блоки в 20251106_data_migration.sql")
+        print("  3. Застосуйте data migration ПЕРЕД schema migration")
+        print("  4. Перевірте результат після міграції")
+    else:
+        print("\n✅ Дані безпечні - немає даних, які будуть втрачені")
+        print("   Можна безпечно застосувати міграції")
+    
+    print("\n" + "=" * 60)
 
 
 if __name__ == "__main__":
@@ -3,23 +3,52 @@
 Check why a specific token was not entered (auto-buy skipped).
 
 Usage:
-  cd server && source venv/bin/activate && PYTHONPATH=. python tools/check_token_entry.py <token_id>
+  cd server && source venv/bin/activate && PYTHONPATH=. python tools/check_token_entry.py <token_id> [<token_id> ...] [--verbose] [--fast] [--json]
+  ... | PYTHONPATH=. python tools/check_token_entry.py --stdin
 """
 from __future__ import annotations
 
+import argparse
 import asyncio
+import json
 import sys
-from _v3_db_pool import get_db_pool
+import asyncpg
+import numpy as np
+from db_config import POSTGRES_CONFIG
 from config import config
 from ai.patterns.catalog import PATTERN_SEED
 
+# Steps 1-4 (token, iterations, open position, enabled wallets) in one round-trip
+ENTRY_STATE_SQL = """
+WITH tok AS (
+    SELECT id, name, token_address, pattern_code, history_ready, wallet_id
+    FROM tokens
+    WHERE id=$1
+),
+it AS (
+    SELECT COUNT(*) AS n FROM token_metrics_seconds
+    WHERE token_id=$1 AND usd_price IS NOT NULL AND usd_price > 0
+),
+op AS (
+    SELECT id, wallet_id, entry_iteration, entry_amount_usd
+    FROM wallet_history
+    WHERE token_id=$1 AND exit_iteration IS NULL
+    LIMIT 1
+),
+ew AS (
+    SELECT 1 FROM wallets WHERE entry_amount_usd IS NOT NULL AND entry_amount_usd > 0
+)
+SELECT (SELECT row_to_json(tok) FROM tok) AS token,
+       (SELECT n FROM it) AS iterations,
+       (SELECT row_to_json(op) FROM op) AS open_position,
+       EXISTS (SELECT 1 FROM ew) AS has_enabled_wallets,
+       -- the exact count is only for display; the InitPlan is skipped unless $2 (verbose)
+       CASE WHEN $2::boolean THEN (SELECT COUNT(*) FROM ew) END AS enabled_wallets
+"""
+
 
-async def check_token_entry(token_id: int):
-    """Check why token was not entered."""
-    pool = await get_db_pool()
-    
-    # Build pattern score map
-    pattern_score_map = {}
+def _load_pattern_scores() -> dict:
+    scores = {}
     for item in PATTERN_SEED:
         code = item.get('code')
         score = int(item.get('score', 0) or 0)
@@ -28,117 +57,148 @@ async def check_token_entry(token_id: int):
         code_str = getattr(code, 'value', str(code))
         if code_str.strip().lower() == 'unknown':
             score = 0
-        pattern_score_map[code_str] = score
-    
-    AUTO_BUY_ENTRY_SEC = int(getattr(config, 'AUTO_BUY_ENTRY_SEC', 80))
-    AI_PREVIEW_ENTRY_SEC = int(getattr(config, 'AI_PREVIEW_ENTRY_SEC', 60))
-    PATTERN_MIN_SCORE = int(getattr(config, 'PATTERN_MIN_SCORE', 80))
-    bad_patterns = ['rug_prequel', 'black_hole', 'flatliner', 'death_spike', 'smoke_bomb', 'mirage_rise', 'panic_sink', 'tug_of_war']
-    
-    async with pool.acquire() as conn:
-        print("=" * 80)
-        print(f"🔍 CHECKING TOKEN {token_id} FOR AUTO-BUY CONDITIONS")
-        print("=" * 80)
-        print()
+        scores[code_str] = score
+    return scores
+
+
+# Immutable across calls: built once at import
+_PATTERN_SCORE_MAP = _load_pattern_scores()
+_BAD_PATTERNS = frozenset({'rug_prequel', 'black_hole', 'flatliner', 'death_spike', 'smoke_bomb', 'mirage_rise', 'panic_sink', 'tug_of_war'})
+
+AUTO_BUY_ENTRY_SEC = int(getattr(config, 'AUTO_BUY_ENTRY_SEC', 80))
+AI_PREVIEW_ENTRY_SEC = int(getattr(config, 'AI_PREVIEW_ENTRY_SEC', 60))
+PATTERN_MIN_SCORE = int(getattr(config, 'PATTERN_MIN_SCORE', 80))
+
+
+async def _connect() -> asyncpg.Connection:
+    # CLI: a single connection, no pool warm-up (same as check_token_full_data.py)
+    cfg = POSTGRES_CONFIG.copy()
+    cfg['database'] = 'crypto_db'
+    cfg.pop('min_size', None)
+    cfg.pop('max_size', None)
+    return await asyncpg.connect(**cfg)
+
+
+async def check_token_entry(token_id: int, verbose: bool = False, fast: bool = False,
+                            conn: asyncpg.Connection | None = None, as_json: bool = False):
+    """Check why token was not entered.
+
+    Pass conn to reuse one connection across many tokens; otherwise a connection is opened and closed here.
+    With as_json the human report is dropped and one JSON line per token is written instead.
+    On an error the output is {"token_id", "error"} (or an error line in the report) and the error is re-raised.
+    """
+    # The report is buffered and written with a single stdout write at the end
+    out: list[str] = []
+    result: dict = {"token_id": token_id}
+
+    def emit(line: str = "") -> None:
+        if not as_json:
+            out.append(line)
+
+    own_conn = conn is None
+    if own_conn:
+        conn = await _connect()
+    try:
+        emit("=" * 80)
+        emit(f"🔍 CHECKING TOKEN {token_id} FOR AUTO-BUY CONDITIONS")
+        emit("=" * 80)
+        emit()
         
+        state = await conn.fetchrow(ENTRY_STATE_SQL, token_id, verbose)
+
         # 1. Get token info
-        token = await conn.fetchrow(
-            """
-            SELECT id, name, token_address, pattern_code, history_ready, wallet_id
-            FROM tokens
-            WHERE id=$1
-            """,
-            token_id
-        )
+        token = json.loads(state['token']) if state['token'] else None
         
+        result["token"] = token
         if not token:
-            print(f"❌ Token {token_id} not found in database")
+            emit(f"❌ Token {token_id} not found in database")
             return
         
-        print(f"1️⃣ TOKEN INFO:")
-        print(f"   ID: {token['id']}")
-        print(f"   Name: {token.get('name') or 'N/A'}")
-        print(f"   Address: {token.get('token_address') or 'N/A'}")
-        print(f"   Pattern: {token.get('pattern_code') or 'N/A'}")
-        print(f"   history_ready: {token.get('history_ready')}")
-        print(f"   wallet_id: {token.get('wallet_id')}")
-        print()
+        emit(f"1️⃣ TOKEN INFO:")
+        emit(f"   ID: {token['id']}")
+        emit(f"   Name: {token.get('name') or 'N/A'}")
+        emit(f"   Address: {token.get('token_address') or 'N/A'}")
+        emit(f"   Pattern: {token.get('pattern_code') or 'N/A'}")
+        emit(f"   history_ready: {token.get('history_ready')}")
+        emit(f"   wallet_id: {token.get('wallet_id')}")
+        emit()
         
         # 2. Check iterations
-        iterations = await conn.fetchval(
-            """
-            SELECT COUNT(*) FROM token_metrics_seconds
-            WHERE token_id=$1 AND usd_price IS NOT NULL AND usd_price > 0
-            """,
-            token_id
-        )
-        iterations = int(iterations or 0)
+        iterations = int(state['iterations'] or 0)
+        result["iterations"] = iterations
         
-        print(f"2️⃣ ITERATIONS:")
-        print(f"   Current iterations: {iterations}")
-        print(f"   AUTO_BUY_ENTRY_SEC: {AUTO_BUY_ENTRY_SEC}")
-        print(f"   AI_PREVIEW_ENTRY_SEC: {AI_PREVIEW_ENTRY_SEC}")
-        print(f"   ✅ Iterations >= AUTO_BUY_ENTRY_SEC: {iterations >= AUTO_BUY_ENTRY_SEC}")
+        emit(f"2️⃣ ITERATIONS:")
+        emit(f"   Current iterations: {iterations}")
+        emit(f"   AUTO_BUY_ENTRY_SEC: {AUTO_BUY_ENTRY_SEC}")
+        emit(f"   AI_PREVIEW_ENTRY_SEC: {AI_PREVIEW_ENTRY_SEC}")
+        emit(f"   ✅ Iterations >= AUTO_BUY_ENTRY_SEC: {iterations >= AUTO_BUY_ENTRY_SEC}")
         if iterations < AUTO_BUY_ENTRY_SEC:
-            print(f"   ⚠️  Token has not reached AUTO_BUY_ENTRY_SEC yet (needs {AUTO_BUY_ENTRY_SEC - iterations} more iterations)")
-        print()
+            emit(f"   ⚠️  Token has not reached AUTO_BUY_ENTRY_SEC yet (needs {AUTO_BUY_ENTRY_SEC - iterations} more iterations)")
+        emit()
         
         # 3. Check open position
-        open_position = await conn.fetchrow(
-            """
-            SELECT id, wallet_id, entry_iteration, entry_amount_usd
-            FROM wallet_history
-            WHERE token_id=$1 AND exit_iteration IS NULL
-            LIMIT 1
-            """,
-            token_id
-        )
+        open_position = json.loads(state['open_position']) if state['open_position'] else None
+        result["open_position"] = open_position
         
-        print(f"3️⃣ OPEN POSITION:")
+        emit(f"3️⃣ OPEN POSITION:")
         if open_position:
-            print(f"   ❌ Open position exists: history_id={open_position['id']}, wallet_id={open_position['wallet_id']}")
-            print(f"   Entry iteration: {open_position.get('entry_iteration')}")
-            print(f"   Entry amount: ${open_position.get('entry_amount_usd') or 0:.2f}")
+            emit(f"   ❌ Open position exists: history_id={open_position['id']}, wallet_id={open_position['wallet_id']}")
+            emit(f"   Entry iteration: {open_position.get('entry_iteration')}")
+            emit(f"   Entry amount: ${open_position.get('entry_amount_usd') or 0:.2f}")
         else:
-            print(f"   ✅ No open position (can enter)")
-        print()
+            emit(f"   ✅ No open position (can enter)")
+        emit()
         
         # 4. Check enabled wallets
-        enabled_wallets = await conn.fetchval(
-            "SELECT COUNT(*) FROM wallets WHERE entry_amount_usd IS NOT NULL AND entry_amount_usd > 0"
-        )
-        enabled_wallets = int(enabled_wallets or 0)
+        has_enabled_wallets = bool(state['has_enabled_wallets'])
+        result["has_enabled_wallets"] = has_enabled_wallets
+        if verbose:
+            result["enabled_wallets"] = int(state['enabled_wallets'] or 0)
         
-        print(f"4️⃣ ENABLED WALLETS:")
-        print(f"   Enabled wallets (entry_amount_usd > 0): {enabled_wallets}")
-        if enabled_wallets == 0:
-            print(f"   ⚠️  All wallets are disabled (entry_amount_usd = 0)")
-        print()
+        emit(f"4️⃣ ENABLED WALLETS:")
+        if verbose:
+            emit(f"   Enabled wallets (entry_amount_usd > 0): {int(state['enabled_wallets'] or 0)}")
+        else:
+            emit(f"   Has enabled wallets (entry_amount_usd > 0): {has_enabled_wallets}")
+        if not has_enabled_wallets:
+            emit(f"   ⚠️  All wallets are disabled (entry_amount_usd = 0)")
+        emit()
         
         # 5. Check pattern
         pattern_code = token.get('pattern_code')
-        print(f"5️⃣ PATTERN CHECK:")
+        emit(f"5️⃣ PATTERN CHECK:")
         if pattern_code:
             pattern_lower = pattern_code.lower()
-            pattern_score = int(pattern_score_map.get(pattern_lower, 0))
-            is_bad = pattern_lower in bad_patterns
+            pattern_score = int(_PATTERN_SCORE_MAP.get(pattern_lower, 0))
+            is_bad = pattern_lower in _BAD_PATTERNS
             is_good = pattern_score >= PATTERN_MIN_SCORE and not is_bad
+            result["pattern"] = {"code": pattern_code, "score": pattern_score, "is_bad": is_bad, "is_good": is_good}
             
-            print(f"   Pattern code: {pattern_code}")
-            print(f"   Pattern score: {pattern_score}")
-            print(f"   PATTERN_MIN_SCORE: {PATTERN_MIN_SCORE}")
-            print(f"   Is bad pattern: {is_bad}")
-            print(f"   ✅ Pattern score >= PATTERN_MIN_SCORE: {pattern_score >= PATTERN_MIN_SCORE}")
-            print(f"   ✅ Pattern is good (not bad): {not is_bad}")
-            print(f"   ✅ Overall pattern check: {is_good}")
+            emit(f"   Pattern code: {pattern_code}")
+            emit(f"   Pattern score: {pattern_score}")
+            emit(f"   PATTERN_MIN_SCORE: {PATTERN_MIN_SCORE}")
+            emit(f"   Is bad pattern: {is_bad}")
+            emit(f"   ✅ Pattern score >= PATTERN_MIN_SCORE: {pattern_score >= PATTERN_MIN_SCORE}")
+            emit(f"   ✅ Pattern is good (not bad): {not is_bad}")
+            emit(f"   ✅ Overall pattern check: {is_good}")
         else:
-            print(f"   ⚠️  No pattern code set")
-        print()
+            emit(f"   ⚠️  No pattern code set")
+        emit()
         
         # 6. Check pattern at AI_PREVIEW_ENTRY_SEC (100s) and later seconds
-        print(f"6️⃣ PATTERN AT {AI_PREVIEW_ENTRY_SEC}s AND LATER CHECK:")
+        emit(f"6️⃣ PATTERN AT {AI_PREVIEW_ENTRY_SEC}s AND LATER CHECK:")
         pattern_at_100s_bad = False
-        if iterations > AI_PREVIEW_ENTRY_SEC:
+        # Step 6 (metrics fetch + feature extraction) is the expensive one: skip it when the
+        # cheap checks above already rule out entry (always for open position / no wallets,
+        # and for any failed check with --fast)
+        entry_blocked = open_position is not None or not has_enabled_wallets
+        if fast:
+            entry_blocked = entry_blocked or iterations < AUTO_BUY_ENTRY_SEC or not (is_good if pattern_code else False)
+        step6_skipped = entry_blocked and iterations > AI_PREVIEW_ENTRY_SEC
+        result["pattern_check_skipped"] = step6_skipped
+        if step6_skipped:
+            emit(f"   ⏭️  Skipped: entry is already ruled out by the checks above")
+        elif iterations > AI_PREVIEW_ENTRY_SEC:
             try:
                 from ai.patterns.full_series_classifier import compute_full_features, choose_best_pattern
                 
@@ -149,110 +209,170 @@ async def check_token_entry(token_id: int):
                     check_points.append(AI_PREVIEW_ENTRY_SEC + offset)
                 
                 pattern_at_check_points = {}
-                
+
+                # One fetch of the longest prefix; shorter check points are slices of it
+                all_rows = await conn.fetch(
+                    """
+                    SELECT usd_price, buy_count, sell_count
+                    FROM token_metrics_seconds
+                    WHERE token_id=$1 AND usd_price IS NOT NULL AND usd_price > 0
+                    ORDER BY ts ASC
+                    LIMIT $2
+                    """,
+                    token_id, max(check_points)
+                )
+
+                # compute_full_features only reads price, buy_count and sell_count
+                # (liquidity/mcap/holders are not used), so only those columns are fetched.
+                # Columns: price, buy_count, sell_count (NULL counts -> 0.0; price is never NULL
+                # here because of the usd_price > 0 filter)
+                series_arr = np.zeros((len(all_rows), 3), dtype=np.float64)
+                for i, r in enumerate(all_rows):
+                    price, buys, sells = r
+                    series_arr[i] = (price, buys or 0.0, sells or 0.0)
+
                 for check_sec in check_points:
-                    check_rows = await conn.fetch(
-                        """
-                        SELECT usd_price, liquidity, mcap, holder_count, buy_count, sell_count
-                        FROM token_metrics_seconds
-                        WHERE token_id=$1 AND usd_price IS NOT NULL AND usd_price > 0
-                        ORDER BY ts ASC
-                        LIMIT $2
-                        """,
-                        token_id, check_sec
-                    )
-                    
+                    check_rows = all_rows[:check_sec]
+
                     if check_rows and len(check_rows) >= 3:
+                        arr = series_arr[:len(check_rows)]
                         series_at_check = {
-                            "price": [float(r.get("usd_price") or 0.0) for r in check_rows],
-                            "liquidity": [float(r.get("liquidity") or 0.0) for r in check_rows],
-                            "mcap": [float(r.get("mcap") or 0.0) for r in check_rows],
-                            "holders": [float(r.get("holder_count") or 0.0) for r in check_rows],
-                            "buy_count": [float(r.get("buy_count") or 0.0) for r in check_rows],
-                            "sell_count": [float(r.get("sell_count") or 0.0) for r in check_rows],
+                            "price": arr[:, 0],
+                            "buy_count": arr[:, 1],
+                            "sell_count": arr[:, 2],
                         }
                         feats_at_check = compute_full_features(series_at_check)
                         pattern_at_check, conf_at_check = choose_best_pattern(feats_at_check)
-                        pattern_at_check_points[check_sec] = (pattern_at_check, conf_at_check)
+                        # Lower-case once; the decision pass below reuses the cached flags
+                        p_low = (pattern_at_check or '').lower()
+                        is_unknown = p_low == 'unknown'
+                        is_bad = p_low in _BAD_PATTERNS
+                        pattern_at_check_points[check_sec] = (pattern_at_check, conf_at_check, is_bad, is_unknown)
+                        result.setdefault("check_points", {})[check_sec] = {
+                            "pattern": pattern_at_check, "confidence": conf_at_check, "is_bad": is_bad,
+                        }
                         
-                        is_bad = pattern_at_check and pattern_at_check.lower() != 'unknown' and pattern_at_check.lower() in bad_patterns
-                        status = "❌ BAD" if is_bad else ("✅ GOOD" if pattern_at_check and pattern_at_check.lower() != 'unknown' else "❓ UNKNOWN")
-                        print(f"   [{check_sec}s] Pattern: {pattern_at_check or 'N/A'} (confidence: {conf_at_check:.2f}) {status}")
+                        status = "❌ BAD" if is_bad else ("✅ GOOD" if p_low and not is_unknown else "❓ UNKNOWN")
+                        emit(f"   [{check_sec}s] Pattern: {pattern_at_check or 'N/A'} (confidence: {conf_at_check:.2f}) {status}")
                     else:
-                        print(f"   [{check_sec}s] ⚠️  Not enough data (need at least 3 records, got {len(check_rows) if check_rows else 0})")
+                        emit(f"   [{check_sec}s] ⚠️  Not enough data (need at least 3 records, got {len(check_rows) if check_rows else 0})")
                 
                 # Use pattern at AI_PREVIEW_ENTRY_SEC (100s) for blocking decision
                 if AI_PREVIEW_ENTRY_SEC in pattern_at_check_points:
-                    pattern_at_100s, conf_at_100s = pattern_at_check_points[AI_PREVIEW_ENTRY_SEC]
+                    pattern_at_100s, conf_at_100s, bad_at_100s, unknown_at_100s = pattern_at_check_points[AI_PREVIEW_ENTRY_SEC]
                     
-                    if pattern_at_100s and pattern_at_100s.lower() != 'unknown' and pattern_at_100s.lower() in bad_patterns:
+                    if bad_at_100s:
                         pattern_at_100s_bad = True
-                        print(f"   ⚠️  Token was bad at {AI_PREVIEW_ENTRY_SEC}s ({pattern_at_100s}) - will be skipped forever")
-                    elif pattern_at_100s and pattern_at_100s.lower() == 'unknown':
+                        emit(f"   ⚠️  Token was bad at {AI_PREVIEW_ENTRY_SEC}s ({pattern_at_100s}) - will be skipped forever")
+                    elif unknown_at_100s:
                         # Pattern was unknown at 100s - check later seconds (101-105s)
                         found_bad_after_100s = False
                         for later_sec in sorted(pattern_at_check_points.keys()):
                             if later_sec > AI_PREVIEW_ENTRY_SEC:
-                                later_pattern, _ = pattern_at_check_points[later_sec]
-                                if later_pattern and later_pattern.lower() != 'unknown' and later_pattern.lower() in bad_patterns:
+                                later_bad = pattern_at_check_points[later_sec][2]
+                                if later_bad:
                                     found_bad_after_100s = True
                                     pattern_at_100s_bad = True
-                                    print(f"   ⚠️  Token was bad at {later_sec}s (after {AI_PREVIEW_ENTRY_SEC}s) - will be skipped forever")
+                                    emit(f"   ⚠️  Token was bad at {later_sec}s (after {AI_PREVIEW_ENTRY_SEC}s) - will be skipped forever")
                                     break
                         
                         if not found_bad_after_100s:
-                            print(f"   ✅ Pattern at {AI_PREVIEW_ENTRY_SEC}s was unknown, checked up to {max(pattern_at_check_points.keys())}s - all unknown/good")
+                            emit(f"   ✅ Pattern at {AI_PREVIEW_ENTRY_SEC}s was unknown, checked up to {max(pattern_at_check_points.keys())}s - all unknown/good")
                 else:
-                    print(f"   ⚠️  Could not determine pattern at {AI_PREVIEW_ENTRY_SEC}s (not enough data)")
+                    emit(f"   ⚠️  Could not determine pattern at {AI_PREVIEW_ENTRY_SEC}s (not enough data)")
             except Exception as e:
-                print(f"   ⚠️  Error checking pattern at {AI_PREVIEW_ENTRY_SEC}s: {e}")
+                result["pattern_check_error"] = str(e)
+                emit(f"   ⚠️  Error checking pattern at {AI_PREVIEW_ENTRY_SEC}s: {e}")
         else:
-            print(f"   ⚠️  Token has only {iterations} iterations (need > {AI_PREVIEW_ENTRY_SEC} to check pattern at {AI_PREVIEW_ENTRY_SEC}s)")
-        print()
+            emit(f"   ⚠️  Token has only {iterations} iterations (need > {AI_PREVIEW_ENTRY_SEC} to check pattern at {AI_PREVIEW_ENTRY_SEC}s)")
+        emit()
         
         # 7. Summary
-        print("=" * 80)
-        print("📊 AUTO-BUY CHECK SUMMARY:")
-        print("=" * 80)
+        emit("=" * 80)
+        emit("📊 AUTO-BUY CHECK SUMMARY:")
+        emit("=" * 80)
         
         checks = []
         checks.append(("Iterations >= AUTO_BUY_ENTRY_SEC", iterations >= AUTO_BUY_ENTRY_SEC))
         checks.append(("No open position", open_position is None))
-        checks.append(("Has enabled wallets", enabled_wallets > 0))
+        checks.append(("Has enabled wallets", has_enabled_wallets))
         checks.append(("Pattern is good", is_good if pattern_code else False))
-        checks.append((f"Pattern at {AI_PREVIEW_ENTRY_SEC}s was not bad", not pattern_at_100s_bad))
+        if not step6_skipped:
+            checks.append((f"Pattern at {AI_PREVIEW_ENTRY_SEC}s was not bad", not pattern_at_100s_bad))
         
         all_passed = all(check[1] for check in checks)
+        result["checks"] = dict(checks)
+        result["all_passed"] = all_passed
         
         for check_name, check_result in checks:
             status = "✅" if check_result else "❌"
-            print(f"   {status} {check_name}: {check_result}")
+            emit(f"   {status} {check_name}: {check_result}")
         
-        print()
+        emit()
         if all_passed:
-            print("✅ ALL CHECKS PASSED - Token SHOULD be entered!")
+            emit("✅ ALL CHECKS PASSED - Token SHOULD be entered!")
         else:
-            print("❌ SOME CHECKS FAILED - Token will NOT be entered")
-            print()
-            print("Reasons:")
+            emit("❌ SOME CHECKS FAILED - Token will NOT be entered")
+            emit()
+            emit("Reasons:")
             for check_name, check_result in checks:
                 if not check_result:
-                    print(f"   - {check_name}")
-        print("=" * 80)
+                    emit(f"   - {check_name}")
+        emit("=" * 80)
+    except Exception as e:
+        # Replace the partial result so a JSON consumer sees one explicit error record per token
+        result = {"token_id": token_id, "error": str(e)}
+        emit(f"❌ Error checking token {token_id}: {e}")
+        raise
+    finally:
+        if own_conn:
+            await conn.close()
+        if as_json:
+            sys.stdout.write(json.dumps(result, default=str) + "\n")
+        elif out:
+            sys.stdout.write("\n".join(out) + "\n")
 
 
 async def main():
-    if len(sys.argv) < 2:
-        print("Usage: python tools/check_token_entry.py <token_id>")
-        sys.exit(1)
-    
+    parser = argparse.ArgumentParser(description="Check why a token was not entered (auto-buy skipped)")
+    parser.add_argument("token_ids", type=int, nargs="*", metavar="token_id")
+    parser.add_argument("--stdin", action="store_true", help="also read newline-separated token ids from stdin")
+    parser.add_argument("--verbose", action="store_true", help="print exact counts (e.g. enabled wallets) instead of yes/no")
+    parser.add_argument("--fast", action="store_true", help="skip the step-6 pattern check whenever an earlier check fails")
+    parser.add_argument("--json", action="store_true", help="one JSON line per token instead of the formatted report")
+    args = parser.parse_args()
+
+    token_ids = list(args.token_ids)
+    if args.stdin:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                token_ids.append(int(line))
+            except ValueError:
+                parser.error(f"invalid token_id on stdin: {line!r}")
+    if not token_ids:
+        parser.error("no token ids given (pass them as arguments or use --stdin)")
+
+    # Batch mode: one process, one connection. Interpreter/numpy/numba start-up and the
+    # compiled pattern kernel (loaded from the numba cache on first use) are paid once.
+    # One bad token does not abort the batch: its error is already reported, move on to the next one.
+    failed = 0
+    conn = await _connect()
     try:
-        token_id = int(sys.argv[1])
-    except ValueError:
-        print(f"Error: Invalid token_id: {sys.argv[1]}")
+        for token_id in token_ids:
+            try:
+                await check_token_entry(token_id, verbose=args.verbose, fast=args.fast, conn=conn, as_json=args.json)
+            except Exception:
+                failed += 1
+                if conn.is_closed():
+                    conn = await _connect()
+    finally:
+        await conn.close()
+
+    if failed:
         sys.exit(1)
-    
-    await check_token_entry(token_id)
 
 
 if __name__ == "__main__":
@@ -3,7 +3,9 @@
 Check all database data for a specific token
 """
 
+import argparse
 import asyncio
+import json
 import sys
 import os
 from datetime import datetime
@@ -15,233 +17,286 @@ from db_config import POSTGRES_CONFIG
 import asyncpg
 
 
-async def check_token_full_data(token_id: int):
-    """Check all database data for token ID"""
+# Запити кроків 1-5 незалежні між собою, тому виконуються паралельно через asyncio.gather
+TOKEN_SQL = """
+SELECT
+    id, token_address, token_pair, name, symbol,
+    usd_price, mcap, liquidity, holder_count,
+    wallet_id, pattern_code, pattern,
+    created_at, token_updated_at
+FROM tokens
+WHERE id = $1
+"""
+
+WALLET_HISTORY_SQL = """
+SELECT
+    id, wallet_id, token_id,
+    entry_amount_usd, entry_token_amount, entry_price_usd, entry_iteration,
+    entry_signature, entry_slippage_bps, entry_actual_amount_usd,
+    exit_amount_usd, exit_token_amount, exit_price_usd, exit_iteration,
+    exit_signature, exit_slippage_bps, exit_actual_amount_usd,
+    profit_usd, profit_pct, outcome, reason,
+    created_at, updated_at
+FROM wallet_history
+WHERE token_id = $1
+ORDER BY id DESC
+"""
+
+TRADE_ATTEMPTS_SQL = """
+SELECT
+    id, token_id, wallet_id, action, status, message, details, created_at
+FROM trade_attempts
+WHERE token_id = $1
+ORDER BY created_at DESC
+LIMIT 20
+"""
+
+RECENT_TRADES_SQL = """
+SELECT
+    id, signature, timestamp, readable_time, direction,
+    amount_tokens, amount_sol, amount_usd, token_price_usd, slot, created_at,
+    COUNT(*) OVER () AS total_count  -- загальна кількість разом з останніми 10, один запит
+FROM trades
+WHERE token_id = $1
+ORDER BY timestamp DESC
+LIMIT 10
+"""
+
+METRICS_COUNT_SQL = """
+SELECT COUNT(*) FROM token_metrics_seconds WHERE token_id = $1
+"""
+
+LATEST_METRIC_SQL = """
+SELECT ts, usd_price, mcap, liquidity, fdv
+FROM token_metrics_seconds
+WHERE token_id = $1
+ORDER BY ts DESC
+LIMIT 1
+"""
+
+# Крок 6 (лише якщо у токена є wallet_id)
+WALLET_SQL = """
+SELECT
+    id, name, initial_deposit_usd, cash_usd,
+    entry_amount_usd, active_token_id, total_profit_usd,
+    created_at, updated_at
+FROM wallets
+WHERE id = $1
+"""
+
+
+async def check_token_full_data(token_id: int, as_json: bool = False):
+    """Check all database data for token ID (as_json: one JSON document instead of the report)"""
+    # Звіт буферизується і виводиться одним write наприкінці (замість сотень print)
+    out = []
+
+    def emit(line: str = "") -> None:
+        out.append(line)
     
     config = POSTGRES_CONFIG.copy()
     config['database'] = 'crypto_db'
     config.pop('min_size', None)
     config.pop('max_size', None)
     
+    pool = None
     try:
-        conn = await asyncpg.connect(**config)
+        pool = await asyncpg.create_pool(min_size=4, max_size=6, **config)
+
+        # Незалежні запити паралельно на пулі: час ≈ найповільніший запит, а не сума
+        token, wallet_history, trade_attempts, recent_trades, metrics_count, latest_metric = await asyncio.gather(
+            pool.fetchrow(TOKEN_SQL, token_id),
+            pool.fetch(WALLET_HISTORY_SQL, token_id),
+            pool.fetch(TRADE_ATTEMPTS_SQL, token_id),
+            pool.fetch(RECENT_TRADES_SQL, token_id),
+            pool.fetchval(METRICS_COUNT_SQL, token_id),
+            pool.fetchrow(LATEST_METRIC_SQL, token_id),
+        )
+
+        if as_json:
+            # Машинний вивід: без форматування звіту, один JSON-документ
+            wallet = None
+            if token and token['wallet_id']:
+                wallet = await pool.fetchrow(WALLET_SQL, token['wallet_id'])
+            result = {
+                "token_id": token_id,
+                "token": dict(token) if token else None,
+                "wallet_history": [dict(r) for r in wallet_history],
+                "trade_attempts": [dict(r) for r in trade_attempts],
+                "trades_total": recent_trades[0]['total_count'] if recent_trades else 0,
+                "recent_trades": [dict(r) for r in recent_trades],
+                "metrics_count": metrics_count,
+                "latest_metric": dict(latest_metric) if latest_metric else None,
+                "wallet": dict(wallet) if wallet else None,
+            }
+            sys.stdout.write(json.dumps(result, default=str, ensure_ascii=False) + "\n")
+            return
         
-        print("=" * 80)
-        print(f"🔍 ПОВНА ПЕРЕВІРКА ТОКЕНУ ID {token_id}")
-        print("=" * 80)
-        print()
+        emit("=" * 80)
+        emit(f"🔍 ПОВНА ПЕРЕВІРКА ТОКЕНУ ID {token_id}")
+        emit("=" * 80)
+        emit()
         
         # 1. Token basic info
-        print("1️⃣ ОСНОВНА ІНФОРМАЦІЯ ПРО ТОКЕН:")
-        print("-" * 80)
-        token = await conn.fetchrow("""
-            SELECT 
-                id, token_address, token_pair, name, symbol,
-                usd_price, mcap, liquidity, holder_count,
-                wallet_id, pattern_code, pattern,
-                created_at, token_updated_at
-            FROM tokens
-            WHERE id = $1
-        """, token_id)
+        emit("1️⃣ ОСНОВНА ІНФОРМАЦІЯ ПРО ТОКЕН:")
+        emit("-" * 80)
         
         if not token:
-            print(f"❌ Токен {token_id} не знайдено в БД!")
-            await conn.close()
+            emit(f"❌ Токен {token_id} не знайдено в БД!")
             return
         
-        print(f"   ID: {token['id']}")
-        print(f"   Address: {token['token_address']}")
-        print(f"   Pair: {token['token_pair']}")
-        print(f"   Name: {token['name']}")
-        print(f"   Symbol: {token['symbol']}")
-        print(f"   Price USD: {token['usd_price']}")
-        print(f"   Market Cap: {token['mcap']}")
-        print(f"   Liquidity: {token['liquidity']}")
-        print(f"   Holders: {token['holder_count']}")
-        print(f"   Wallet ID: {token['wallet_id']}")
-        print(f"   Pattern Code: {token['pattern_code']}")
-        print(f"   Pattern: {token['pattern']}")
-        print(f"   Created: {token['created_at']}")
-        print(f"   Updated: {token['token_updated_at']}")
-        print()
+        emit(f"   ID: {token['id']}")
+        emit(f"   Address: {token['token_address']}")
+        emit(f"   Pair: {token['token_pair']}")
+        emit(f"   Name: {token['name']}")
+        emit(f"   Symbol: {token['symbol']}")
+        emit(f"   Price USD: {token['usd_price']}")
+        emit(f"   Market Cap: {token['mcap']}")
+        emit(f"   Liquidity: {token['liquidity']}")
+        emit(f"   Holders: {token['holder_count']}")
+        emit(f"   Wallet ID: {token['wallet_id']}")
+        emit(f"   Pattern Code: {token['pattern_code']}")
+        emit(f"   Pattern: {token['pattern']}")
+        emit(f"   Created: {token['created_at']}")
+        emit(f"   Updated: {token['token_updated_at']}")
+        emit()
         
         # 2. Wallet history (buy/sell operations)
-        print("2️⃣ ІСТОРІЯ ПОКУПОК/ПРОДАЖ (wallet_history):")
-        print("-" * 80)
-        wallet_history = await conn.fetch("""
-            SELECT 
-                id, wallet_id, token_id,
-                entry_amount_usd, entry_token_amount, entry_price_usd, entry_iteration,
-                entry_signature, entry_slippage_bps, entry_actual_amount_usd,
-                exit_amount_usd, exit_token_amount, exit_price_usd, exit_iteration,
-                exit_signature, exit_slippage_bps, exit_actual_amount_usd,
-                profit_usd, profit_pct, outcome, reason,
-                created_at, updated_at
-            FROM wallet_history
-            WHERE token_id = $1
-            ORDER BY id DESC
-        """, token_id)
+        emit("2️⃣ ІСТОРІЯ ПОКУПОК/ПРОДАЖ (wallet_history):")
+        emit("-" * 80)
         
         if wallet_history:
             for i, wh in enumerate(wallet_history, 1):
-                print(f"   Запис #{i} (ID: {wh['id']}):")
-                print(f"      Wallet ID: {wh['wallet_id']}")
-                print(f"      ENTRY:")
-                print(f"         Amount USD: {wh['entry_amount_usd']}")
-                print(f"         Token Amount: {wh['entry_token_amount']}")
-                print(f"         Price USD: {wh['entry_price_usd']}")
-                print(f"         Iteration: {wh['entry_iteration']}")
-                print(f"         Signature: {wh['entry_signature']}")
-                print(f"         Slippage: {wh['entry_slippage_bps']} bps")
-                print(f"         Actual Amount: {wh['entry_actual_amount_usd']}")
-                print(f"      EXIT:")
-                print(f"         Amount USD: {wh['exit_amount_usd']}")
-                print(f"         Token Amount: {wh['exit_token_amount']}")
-                print(f"         Price USD: {wh['exit_price_usd']}")
-                print(f"         Iteration: {wh['exit_iteration']}")
-                print(f"         Signature: {wh['exit_signature']}")
-                print(f"         Slippage: {wh['exit_slippage_bps']} bps")
-                print(f"         Actual Amount: {wh['exit_actual_amount_usd']}")
-                print(f"      RESULT:")
-                print(f"         Profit USD: {wh['profit_usd']}")
-                print(f"         Profit %: {wh['profit_pct']}")
-                print(f"         Outcome: {wh['outcome']}")
-                print(f"         Reason: {wh['reason']}")
-                print(f"      Created: {wh['created_at']}")
-                print(f"      Updated: {wh['updated_at']}")
-                print()
+                emit(f"   Запис #{i} (ID: {wh['id']}):")
+                emit(f"      Wallet ID: {wh['wallet_id']}")
+                emit(f"      ENTRY:")
+                emit(f"         Amount USD: {wh['entry_amount_usd']}")
+                emit(f"         Token Amount: {wh['entry_token_amount']}")
+                emit(f"         Price USD: {wh['entry_price_usd']}")
+                emit(f"         Iteration: {wh['entry_iteration']}")
+                emit(f"         Signature: {wh['entry_signature']}")
+                emit(f"         Slippage: {wh['entry_slippage_bps']} bps")
+                emit(f"         Actual Amount: {wh['entry_actual_amount_usd']}")
+                emit(f"      EXIT:")
+                emit(f"         Amount USD: {wh['exit_amount_usd']}")
+                emit(f"         Token Amount: {wh['exit_token_amount']}")
+                emit(f"         Price USD: {wh['exit_price_usd']}")
+                emit(f"         Iteration: {wh['exit_iteration']}")
+                emit(f"         Signature: {wh['exit_signature']}")
+                emit(f"         Slippage: {wh['exit_slippage_bps']} bps")
+                emit(f"         Actual Amount: {wh['exit_actual_amount_usd']}")
+                emit(f"      RESULT:")
+                emit(f"         Profit USD: {wh['profit_usd']}")
+                emit(f"         Profit %: {wh['profit_pct']}")
+                emit(f"         Outcome: {wh['outcome']}")
+                emit(f"         Reason: {wh['reason']}")
+                emit(f"      Created: {wh['created_at']}")
+                emit(f"      Updated: {wh['updated_at']}")
+                emit()
         else:
-            print("   ⚠️  Немає записів в wallet_history")
-            print()
+            emit("   ⚠️  Немає записів в wallet_history")
+            emit()
         
         # 3. Trade attempts (buy/sell attempts)
-        print("3️⃣ СПРОБИ ТОРГІВЛІ (trade_attempts):")
-        print("-" * 80)
-        trade_attempts = await conn.fetch("""
-            SELECT 
-                id, token_id, wallet_id, action, status, message, details, created_at
-            FROM trade_attempts
-            WHERE token_id = $1
-            ORDER BY created_at DESC
-            LIMIT 20
-        """, token_id)
+        emit("3️⃣ СПРОБИ ТОРГІВЛІ (trade_attempts):")
+        emit("-" * 80)
         
         if trade_attempts:
             for i, ta in enumerate(trade_attempts, 1):
-                print(f"   Спроба #{i} (ID: {ta['id']}):")
-                print(f"      Action: {ta['action']}")
-                print(f"      Status: {ta['status']}")
-                print(f"      Wallet ID: {ta['wallet_id']}")
-                print(f"      Message: {ta['message']}")
-                print(f"      Details: {ta['details']}")
-                print(f"      Created: {ta['created_at']}")
-                print()
+                emit(f"   Спроба #{i} (ID: {ta['id']}):")
+                emit(f"      Action: {ta['action']}")
+                emit(f"      Status: {ta['status']}")
+                emit(f"      Wallet ID: {ta['wallet_id']}")
+                emit(f"      Message: {ta['message']}")
+                emit(f"      Details: {ta['details']}")
+                emit(f"      Created: {ta['created_at']}")
+                emit()
         else:
-            print("   ⚠️  Немає записів в trade_attempts")
-            print()
+            emit("   ⚠️  Немає записів в trade_attempts")
+            emit()
         
         # 4. Recent trades
-        print("4️⃣ ОСТАННІ ТРАНЗАКЦІЇ (trades):")
-        print("-" * 80)
-        recent_trades = await conn.fetch("""
-            SELECT 
-                id, signature, timestamp, readable_time, direction,
-                amount_tokens, amount_sol, amount_usd, token_price_usd, slot, created_at
-            FROM trades
-            WHERE token_id = $1
-            ORDER BY timestamp DESC
-            LIMIT 10
-        """, token_id)
+        emit("4️⃣ ОСТАННІ ТРАНЗАКЦІЇ (trades):")
+        emit("-" * 80)
         
         if recent_trades:
-            print(f"   Всього транзакцій: {await conn.fetchval('SELECT COUNT(*) FROM trades WHERE token_id = $1', token_id)}")
-            print()
+            emit(f"   Всього транзакцій: {recent_trades[0]['total_count']}")
+            emit()
             for i, trade in enumerate(recent_trades, 1):
-                print(f"   Транзакція #{i}:")
-                print(f"      Signature: {trade['signature']}")
-                print(f"      Time: {trade['readable_time']} (timestamp: {trade['timestamp']})")
-                print(f"      Direction: {trade['direction']}")
-                print(f"      Amount Tokens: {trade['amount_tokens']}")
-                print(f"      Amount SOL: {trade['amount_sol']}")
-                print(f"      Amount USD: {trade['amount_usd']}")
-                print(f"      Token Price USD: {trade['token_price_usd']}")
-                print(f"      Slot: {trade['slot']}")
-                print()
+                emit(f"   Транзакція #{i}:")
+                emit(f"      Signature: {trade['signature']}")
+                emit(f"      Time: {trade['readable_time']} (timestamp: {trade['timestamp']})")
+                emit(f"      Direction: {trade['direction']}")
+                emit(f"      Amount Tokens: {trade['amount_tokens']}")
+                emit(f"      Amount SOL: {trade['amount_sol']}")
+                emit(f"      Amount USD: {trade['amount_usd']}")
+                emit(f"      Token Price USD: {trade['token_price_usd']}")
+                emit(f"      Slot: {trade['slot']}")
+                emit()
         else:
-            print("   ⚠️  Немає транзакцій")
-            print()
+            emit("   ⚠️  Немає транзакцій")
+            emit()
         
         # 5. Metrics count
-        print("5️⃣ МЕТРИКИ (token_metrics_seconds):")
-        print("-" * 80)
-        metrics_count = await conn.fetchval("""
-            SELECT COUNT(*) FROM token_metrics_seconds WHERE token_id = $1
-        """, token_id)
-        print(f"   Всього метрик: {metrics_count}")
+        emit("5️⃣ МЕТРИКИ (token_metrics_seconds):")
+        emit("-" * 80)
+        emit(f"   Всього метрик: {metrics_count}")
         
         if metrics_count > 0:
-            latest_metric = await conn.fetchrow("""
-                SELECT ts, usd_price, mcap, liquidity, fdv
-                FROM token_metrics_seconds
-                WHERE token_id = $1
-                ORDER BY ts DESC
-                LIMIT 1
-            """, token_id)
             if latest_metric:
-                print(f"   Остання метрика:")
-                print(f"      Timestamp: {latest_metric['ts']}")
-                print(f"      Price USD: {latest_metric['usd_price']}")
-                print(f"      Market Cap: {latest_metric['mcap']}")
-                print(f"      Liquidity: {latest_metric['liquidity']}")
-                print()
+                emit(f"   Остання метрика:")
+                emit(f"      Timestamp: {latest_metric['ts']}")
+                emit(f"      Price USD: {latest_metric['usd_price']}")
+                emit(f"      Market Cap: {latest_metric['mcap']}")
+                emit(f"      Liquidity: {latest_metric['liquidity']}")
+                emit()
         
         # 6. Wallet info (if wallet_id exists)
         if token['wallet_id']:
-            print("6️⃣ ІНФОРМАЦІЯ ПРО ГАМАНЕЦЬ:")
-            print("-" * 80)
-            wallet = await conn.fetchrow("""
-                SELECT 
-                    id, name, initial_deposit_usd, cash_usd,
-                    entry_amount_usd, active_token_id, total_profit_usd,
-                    created_at, updated_at
-                FROM wallets
-                WHERE id = $1
-            """, token['wallet_id'])
+            emit("6️⃣ ІНФОРМАЦІЯ ПРО ГАМАНЕЦЬ:")
+            emit("-" * 80)
+            wallet = await pool.fetchrow(WALLET_SQL, token['wallet_id'])
             
             if wallet:
-                print(f"   Wallet ID: {wallet['id']}")
-                print(f"   Name: {wallet['name']}")
-                print(f"   Initial Deposit: ${wallet['initial_deposit_usd']}")
-                print(f"   Cash USD: ${wallet['cash_usd']}")
-                print(f"   Entry Amount USD: ${wallet['entry_amount_usd']}")
-                print(f"   Active Token ID: {wallet['active_token_id']}")
-                print(f"   Total Profit USD: ${wallet['total_profit_usd']}")
-                print(f"   Created: {wallet['created_at']}")
-                print(f"   Updated: {wallet['updated_at']}")
-                print()
+                emit(f"   Wallet ID: {wallet['id']}")
+                emit(f"   Name: {wallet['name']}")
+                emit(f"   Initial Deposit: ${wallet['initial_deposit_usd']}")
+                emit(f"   Cash USD: ${wallet['cash_usd']}")
+                emit(f"   Entry Amount USD: ${wallet['entry_amount_usd']}")
+                emit(f"   Active Token ID: {wallet['active_token_id']}")
+                emit(f"   Total Profit USD: ${wallet['total_profit_usd']}")
+                emit(f"   Created: {wallet['created_at']}")
+                emit(f"   Updated: {wallet['updated_at']}")
+                emit()
             else:
-                print(f"   ⚠️  Гаманець {token['wallet_id']} не знайдено")
-                print()
-        
-        print("=" * 80)
-        print("✅ ПЕРЕВІРКА ЗАВЕРШЕНА")
-        print("=" * 80)
+                emit(f"   ⚠️  Гаманець {token['wallet_id']} не знайдено")
+                emit()
         
-        await conn.close()
+        emit("=" * 80)
+        emit("✅ ПЕРЕВІРКА ЗАВЕРШЕНА")
+        emit("=" * 80)
         
     except Exception as e:
-        print(f"❌ Помилка: {e}")
+        if as_json:
+            sys.stdout.write(json.dumps({"token_id": token_id, "error": str(e)}, ensure_ascii=False) + "\n")
+        else:
+            emit(f"❌ Помилка: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        # Пул закривається на будь-якому виході, включно з помилкою запиту
+        if pool is not None:
+            await pool.close()
+        if out:
+            sys.stdout.write("\n".join(out) + "\n")
 
 
 async def main():
-    if len(sys.argv) < 2:
-        print("Використання: python check_token_full_data.py <token_id>")
-        sys.exit(1)
-    
-    token_id = int(sys.argv[1])
-    await check_token_full_data(token_id)
+    parser = argparse.ArgumentParser(description="Повна перевірка даних токена в БД")
+    parser.add_argument("token_id", type=int)
+    parser.add_argument("--json", action="store_true", help="вивести один JSON-документ замість звіту")
+    args = parser.parse_args()
+
+    await check_token_full_data(args.token_id, as_json=args.json)
 
 
 if __name__ == "__main__":